@@ -1,7 +1,11 @@
 import logging
-import subprocess
+import os
 from typing import Any
 
+import requests
+from fusionbrain.experts.base_expert import note_failure
+from fusionbrain.utils.text_utils import TextUtils
+
 # Настраиваем логгер
 logger = logging.getLogger(__name__)
 
@@ -12,17 +16,32 @@ class Aggregator:
     Использует локальную LLM (Ollama) для объединения ответов экспертов.
     """
 
+    OLLAMA_URL = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+    KEEP_ALIVE = "30m"
+    TIMEOUT = 120.0
+
+    # Примерный бюджет токенов на ответы экспертов внутри промпта merge()
+    COT_TOKEN_BUDGET = 2000
+
     def __init__(self):
         self.model_name = "llama3.1"
+        # Одна HTTP-сессия на весь жизненный цикл: соединение с Ollama
+        # переиспользуется, а модель остается загруженной между merge/refine.
+        self._session = requests.Session()
 
     def merge(self, prompt: str, expert_outputs: list[dict], state: Any) -> str:
         """
         Собирает ответы экспертов и формирует итоговый ответ через LLM.
         """
-        inputs_text = ""
-        for item in expert_outputs:
-            if item.get("output"):
-                inputs_text += f"\n--- Expert: {item['expert']} ---\n{item['output']}\n"
+        filled = [item for item in expert_outputs if item.get("output")]
+        # Эксперты часто цитируют друг друга: повторы сворачиваются в ссылки [SEEN §N]
+        outputs = TextUtils.dedup_blocks([str(item["output"]) for item in filled])
+        # Приоритет — порядок expert_outputs: при нехватке бюджета сжимаются первые ответы
+        outputs = TextUtils.fit_token_budget(outputs, self.COT_TOKEN_BUDGET)
+        inputs_text = "".join(
+            f"\n--- Expert: {item['expert']} ---\n{output}\n"
+            for item, output in zip(filled, outputs, strict=False)
+        )
 
         if not inputs_text.strip():
             return "Я подумал, но эксперты не дали мне информации. Попробуйте переформулировать запрос."
@@ -53,7 +72,7 @@ class Aggregator:
         feedback = critique.get("feedback", "")
 
         if score < 0.5 and feedback:
-            logger.info(f"[Aggregator] Refining answer due to low score: {score}")
+            logger.info("[Aggregator] Refining answer due to low score: %s", score)
             prompt = (
                 f"Вот ответ: \n{current_answer}\n\n"
                 f"Критика: {feedback}\n\n"
@@ -63,36 +82,40 @@ class Aggregator:
 
         return current_answer
 
+    def _build_payload(self, prompt: str, system: str, stream: bool) -> dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt},
+            ],
+            "stream": stream,
+            "keep_alive": self.KEEP_ALIVE,
+        }
+
     def _call_ollama(self, prompt: str, system: str) -> str:
         """
-        Внутренний метод для обращения к Ollama через консоль.
-        Заменяет необходимость файла llm_engine.py.
+        Внутренний метод для обращения к Ollama через HTTP API (/api/chat).
+        keep_alive держит модель в памяти, чтобы не платить за холодную загрузку.
         """
-        full_prompt = f"System: {system}\nUser: {prompt}"
-
-        cmd = ["ollama", "run", self.model_name]
+        payload = self._build_payload(prompt, system, stream=False)
 
         try:
-            proc = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                bufsize=1,
-                universal_newlines=True,
-                encoding="utf-8",
+            resp = self._session.post(
+                f"{self.OLLAMA_URL}/api/chat", json=payload, timeout=self.TIMEOUT
             )
 
-            stdout, stderr = proc.communicate(input=full_prompt)
-
-            if proc.returncode != 0:
-                logger.error(f"Ollama Error: {stderr}")
-                return f"Произошла ошибка генерации: {stderr}"
+            if resp.status_code != 200:
+                logger.error(f"Ollama Error: {resp.text}")
+                note_failure()
+                return f"Произошла ошибка генерации: {resp.text}"
 
-            return stdout.strip()
+            return resp.json()["message"]["content"].strip()
 
-        except FileNotFoundError:
-            return "Ошибка: Ollama не установлена или недоступна в PATH."
+        except requests.ConnectionError:
+            note_failure()
+            return f"Ошибка: Ollama не запущена или недоступна по адресу {self.OLLAMA_URL}"
         except Exception as e:
             logger.error(f"LLM Call Error: {e}")
+            note_failure()
             return f"Ошибка вызова нейросети: {e}"
@@ -1,10 +1,17 @@
 import logging
+import queue
+import re
+import threading
 import time
 import uuid
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Union
 
+from fusionbrain.core.aggregator import Aggregator
 from fusionbrain.core.knowledge import KnowledgeBase
 from fusionbrain.core.memory import Memory
+from fusionbrain.experts.base_expert import failure_count
 from fusionbrain.experts.code_expert import CodeExpert
 from fusionbrain.experts.critic_expert import CriticExpert
 from fusionbrain.experts.policy_sampler import PolicySampler
@@ -13,28 +20,32 @@ from fusionbrain.experts.research_expert import ResearchExpert
 from fusionbrain.experts.web_expert import WebExpert
 from fusionbrain.experts.world_model_expert import WorldModelExpert
 from fusionbrain.meta.meta_learning import MetaLearning
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
-    datefmt="%H:%M:%S",
-)
+from fusionbrain.utils.sandbox import Sandbox
+from fusionbrain.utils.text_utils import TextUtils
 
 logger = logging.getLogger("FusionBrain")
 
+# retrieve() отдает находки строками "[CATEGORY] текст" по убыванию близости
+_HIT_RE = re.compile(r"\n(?=\[[A-Z_]+\] )")
+
 
 class FusionBrain:
-    CONTEXT_LIMIT = 4000
+    # Бюджет контекста эксперта в токенах (~4 символа на токен, как в TextUtils)
+    CONTEXT_TOKEN_BUDGET = 1000
     CRITIQUE_LIMIT = 2000
+    # Ответы, которые можно отдавать из семантического кэша. RESEARCH и прочие маршруты
+    # зависят от веба и времени запроса, поэтому в кэш не попадают.
+    CACHEABLE_INTENTS = frozenset({"CHAT", "REASONING"})
 
     def __init__(self):
         self.session_id = str(uuid.uuid4())
 
-        logger.info(f"🤖 Booting FusionBrain v7.1 - Session: {self.session_id}")
+        logger.info("🤖 Booting FusionBrain v7.1 - Session: %s", self.session_id)
 
         self.memory = Memory()
         self.knowledge = KnowledgeBase()
         self.meta_learner = MetaLearning(self.memory)
+        self.aggregator = Aggregator()
 
         self.router = PolicySampler()
         self.world = WorldModelExpert()
@@ -53,15 +64,37 @@ class FusionBrain:
 
         self.default_expert = self.reasoning_expert
 
+        # Роутинг (LLM) и поиск по базе знаний (эмбеддинг + Chroma) независимы,
+        # поэтому выполняются параллельно в общем пуле.
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="FusionBrain")
+
+        # Песочница с прогретым unittest поднимается в фоне, не задерживая загрузку
+        self._pool.submit(Sandbox.prewarm)
+
         print(f"[FusionBrain] Session started: {self.session_id}")
         print("[FusionBrain] Pipeline Mode: Robust Agent")
 
-    def think(self, user_prompt: str) -> str:
+    def think(self, user_prompt: str, on_token: Callable[[str], None] | None = None) -> str:
         start_time = time.time()
 
         self.memory.store_user(user_prompt)
 
-        plan = self.router.classify_intent(user_prompt)
+        cached, prompt_embedding = self.knowledge.lookup_response(user_prompt)
+        if cached is not None:
+            print("⚡ Semantic cache hit")
+            self.memory.store_assistant(cached)
+            # Эпизод пишется как обычно; награду мета-обучение уже выдало этому ответу,
+            # когда он попадал в кэш, поэтому повторно он не оценивается
+            self.memory.save_episode(user_prompt, cached, success=True)
+            return cached
+
+        # Сбои обращения к модели возвращаются текстом; признак сбоя — сдвиг счетчика
+        failures_before = failure_count()
+
+        route_future = self._pool.submit(self.router.classify_intent, user_prompt)
+        retrieve_future = self._pool.submit(self.knowledge.retrieve, user_prompt, top_k=2)
+
+        plan = route_future.result()
 
         intent = plan.get("intent", "CHAT")
         target_expert_name = plan.get("expert", "ReasoningExpert")
@@ -69,26 +102,128 @@ class FusionBrain:
 
         print(f"🧭 Route: [{intent}] -> {target_expert_name} ({difficulty}/10)")
 
-        retrieved = self.knowledge.retrieve(user_prompt, n_results=2)
-        retrieved_str = str(retrieved)
+        retrieved = retrieve_future.result()
+        knowledge = self._knowledge_context(str(retrieved), user_prompt)
 
         lessons_context = ""
-        if "[LESSON]" in retrieved_str:
+        if "[LESSON]" in knowledge:
             lessons_context = (
                 "\nCRITICAL MEMORY:\n"
-                f"{retrieved_str[:self.CONTEXT_LIMIT]}\n"
+                f"{knowledge}\n"
                 "Avoid repeating this."
             )
 
-        prompt_for_expert = (user_prompt + lessons_context)[-self.CONTEXT_LIMIT :]
+        prompt_for_expert = user_prompt + lessons_context
 
         context: dict[str, Any] = {
             "prompt": prompt_for_expert,
             "memory": self.memory.recent(3),
-            "knowledge": retrieved_str[: self.CONTEXT_LIMIT],
+            "knowledge": knowledge,
             "prev_output": "",
         }
 
+        if intent == "CHAT" and on_token is not None:
+            expert = self.experts_map.get(target_expert_name, self.default_expert)
+            final_response = self._stream_expert(expert, context, on_token)
+        else:
+            final_response = self._run_expert(
+                user_prompt, target_expert_name, intent, difficulty, context
+            )
+
+        self.meta_learner.track(target_expert_name, final_response)
+        stats = self.meta_learner.evaluate_episode(user_prompt, final_response)
+
+        if stats.get("lesson"):
+            # Уроки шаблонные и часто перефразируют друг друга: храним только новые по смыслу
+            self.knowledge.add_if_novel(
+                f"[LESSON] {stats['lesson']}",
+                category="meta",
+                tags=["auto"],
+            )
+
+        self.memory.store_assistant(final_response)
+        self.memory.save_episode(user_prompt, final_response, success=stats["reward"] > 0)
+
+        # В постоянный кэш попадает только ход без единого сбоя модели или эксперта:
+        # иначе текст ошибки отдавался бы на все похожие запросы и после рестарта
+        if (
+            intent in self.CACHEABLE_INTENTS
+            and stats["reward"] > 0
+            and failure_count() == failures_before
+        ):
+            self.knowledge.store_response(user_prompt, final_response, prompt_embedding)
+
+        elapsed = time.time() - start_time
+        print(f"✅ Done in {elapsed:.2f}s | Reward {stats['reward']:.2f}")
+
+        return final_response
+
+    def think_stream(self, user_prompt: str) -> Iterator[str]:
+        """
+        Генератор для UI (st.write_stream): токены простого диалога отдаются по мере
+        генерации, ответ эксперта — одним куском, когда он готов.
+        """
+        tokens: queue.Queue = queue.Queue()
+        done = object()
+        outcome: dict[str, Any] = {}
+
+        def worker():
+            try:
+                outcome["response"] = self.think(user_prompt, on_token=tokens.put)
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                tokens.put(done)
+
+        threading.Thread(target=worker, name="FusionBrain-think", daemon=True).start()
+
+        streamed = False
+        while (chunk := tokens.get()) is not done:
+            streamed = True
+            yield chunk
+
+        if "error" in outcome:
+            raise outcome["error"]
+
+        if not streamed:
+            yield outcome["response"]
+
+    def _stream_expert(
+        self, expert: Any, context: dict[str, Any], on_token: Callable[[str], None]
+    ) -> str:
+        """
+        Простой диалог: тот же эксперт и тот же контекст, что и в _run_expert,
+        но токены отдаются потребителю по мере генерации.
+        """
+        parts: list[str] = []
+        for chunk in expert.run_stream(context):
+            on_token(chunk)
+            parts.append(chunk)
+        return "".join(parts)
+
+    @classmethod
+    def _knowledge_context(cls, retrieved: str, user_prompt: str = "") -> str:
+        """
+        Находки базы знаний для промпта эксперта. Уроки и факты часто повторяют друг друга:
+        повторы сворачиваются в ссылки [SEEN §N], оригинал остается в самой близкой находке.
+        Запрос пользователя не режется: находкам достается остаток CONTEXT_TOKEN_BUDGET,
+        и сверх него дальние находки сжимаются до резюме раньше ближних.
+        """
+        hits = TextUtils.dedup_blocks(_HIT_RE.split(retrieved) if retrieved else [])
+
+        budget = max(0, cls.CONTEXT_TOKEN_BUDGET - len(user_prompt) // 4)
+        # fit_token_budget держит целиком конец списка: ближайшие находки идут последними
+        fitted = TextUtils.fit_token_budget(hits[::-1], budget)
+        return "\n".join(reversed(fitted))
+
+    def _run_expert(
+        self,
+        user_prompt: str,
+        target_expert_name: str,
+        intent: str,
+        difficulty: int,
+        context: dict[str, Any],
+    ) -> str:
         final_response = ""
 
         max_retries = 2 if difficulty > 4 else 1
@@ -109,9 +244,7 @@ class FusionBrain:
 
             if intent in {"CODING", "REASONING"} and difficulty >= 4:
                 context["prev_output"] = result
-                critique = self.critic.run(context)
-
-                passed = "[VERDICT]: PASS" in critique or "✅" in critique
+                passed, critique = self._stream_critique(context)
 
                 if passed:
                     final_response = result
@@ -124,24 +257,29 @@ class FusionBrain:
                 final_response = result
                 break
 
-        self.meta_learner.track(target_expert_name, final_response)
-        stats = self.meta_learner.evaluate_episode(user_prompt, final_response)
-
-        if stats.get("lesson"):
-            self.knowledge.add(
-                f"[LESSON] {stats['lesson']}",
-                category="meta",
-                tags=["auto"],
-            )
-
-        self.memory.store_assistant(final_response)
-        self.memory.save_episode(user_prompt, final_response, success=stats["reward"] > 0)
-
-        elapsed = time.time() - start_time
-        print(f"✅ Done in {elapsed:.2f}s | Reward {stats['reward']:.2f}")
-
         return final_response
 
+    def _stream_critique(self, context: dict[str, Any]) -> tuple[bool, str]:
+        """
+        Читает критику потоком и обрывает генерацию на первом PASS.
+        При FAIL дочитывает до конца, потому что после вердикта идет разбор ошибок.
+        """
+        parts: list[str] = []
+        tail = ""
+        stream = self.critic.run_stream(context)
+
+        try:
+            for chunk in stream:
+                parts.append(chunk)
+                window = tail + chunk
+                if "[VERDICT]: PASS" in window or "✅" in window:
+                    return True, "".join(parts)
+                tail = window[-len("[VERDICT]: PASS") :]
+        finally:
+            stream.close()
+
+        return False, "".join(parts)
+
     def repl(self):
         print("\n=== FusionBrain ===\n")
 
@@ -150,14 +288,25 @@ class FusionBrain:
                 user = input("👤 ")
 
                 if user.lower() in {"exit", "quit"}:
+                    self.knowledge.flush()
                     break
 
                 if not user.strip():
                     continue
 
                 print("\n🤖")
-                response = self.think(user)
-                print(response)
+                streamed: list[str] = []
+
+                def echo(token: str, sink: list[str] = streamed) -> None:
+                    sink.append(token)
+                    print(token, end="", flush=True)
+
+                response = self.think(user, on_token=echo)
+                # Строку потокового вывода завершает сам REPL, а не библиотечный код
+                if streamed:
+                    print()
+                else:
+                    print(response)
 
             except KeyboardInterrupt:
                 break
@@ -1,5 +1,7 @@
+import heapq
 import time
 import uuid
+from collections import deque
 from enum import Enum
 
 
@@ -11,29 +13,57 @@ class GoalStatus(Enum):
 
 
 class Goal:
+    __slots__ = (
+        "id",
+        "description",
+        "priority",
+        "status",
+        "created_at",
+        "completed_at",
+        "parent_id",
+        "subgoals",
+        "_dict_cache",
+    )
+
     def __init__(self, description: str, priority: int = 1, parent_id: str = None):
         self.id = str(uuid.uuid4())
         self.description = description
         self.priority = priority  # 1 (low) to 5 (high)
-        self.status = GoalStatus.ACTIVE.value
+        self.status: GoalStatus = GoalStatus.ACTIVE
         self.created_at = time.time()
         self.completed_at = None
         self.parent_id = parent_id
         self.subgoals = []
+        self._dict_cache: dict | None = None
 
     def complete(self):
-        self.status = GoalStatus.COMPLETED.value
+        self.status = GoalStatus.COMPLETED
         self.completed_at = time.time()
+        self._bump()
 
     def fail(self):
-        self.status = GoalStatus.FAILED.value
+        self.status = GoalStatus.FAILED
+        self._bump()
+
+    def add_subgoal(self, goal_id: str):
+        self.subgoals.append(goal_id)
+        self._bump()
+
+    def _bump(self):
+        """Сбрасывает закэшированный to_dict() после изменения цели."""
+        self._dict_cache = None
 
     def to_dict(self):
+        if self._dict_cache is None:
+            self._dict_cache = self._build_dict()
+        return self._dict_cache
+
+    def _build_dict(self):
         return {
             "id": self.id,
             "description": self.description,
             "priority": self.priority,
-            "status": self.status,
+            "status": self.status.value,
             "created_at": self.created_at,
             "completed_at": self.completed_at,
             "parent_id": self.parent_id,
@@ -47,34 +77,76 @@ class GoalManager:
     Позволяет создавать дерево задач, отслеживать прогресс и приоритизировать действия.
     """
 
+    # После стольких завершений старые цели автоматически уходят в архив
+    COMPACT_THRESHOLD = 256
+    ARCHIVE_LIMIT = 1000
+
     def __init__(self):
         self.goals: dict[str, Goal] = {}
+        self._archive: deque[dict] = deque(maxlen=self.ARCHIVE_LIMIT)
+        self._completed_since_compact = 0
+        # Куча активных целей: (-priority, -created_at, id). Завершенные цели удаляются лениво.
+        self._active_heap: list[tuple[int, float, str]] = []
+        self._stale = 0
 
     def add_goal(self, description: str, priority: int = 1, parent_id: str = None) -> str:
         goal = Goal(description, priority, parent_id)
         self.goals[goal.id] = goal
+        heapq.heappush(self._active_heap, (-goal.priority, -goal.created_at, goal.id))
         if parent_id and parent_id in self.goals:
-            self.goals[parent_id].subgoals.append(goal.id)
+            self.goals[parent_id].add_subgoal(goal.id)
 
         return goal.id
 
     def complete_goal(self, goal_id: str):
         if goal_id in self.goals:
             self.goals[goal_id].complete()
+            self._stale += 1
+            self._completed_since_compact += 1
+
+            if self._completed_since_compact > self.COMPACT_THRESHOLD:
+                self.clear_completed()
+            elif self._stale > len(self._active_heap) // 2:
+                self._rebuild_heap()
 
     def get_goal(self, goal_id: str) -> Goal | None:
         return self.goals.get(goal_id)
 
-    def current(self) -> list[dict]:
-        """Возвращает список только активных целей, отсортированных по приоритету."""
-        active_goals = [g for g in self.goals.values() if g.status == GoalStatus.ACTIVE.value]
-        active_goals.sort(key=lambda x: (x.priority, x.created_at), reverse=True)
-
-        return [g.to_dict() for g in active_goals]
+    def current(self, top_k: int | None = None) -> list[dict]:
+        """
+        Возвращает активные цели, отсортированные по приоритету (затем по свежести).
+        top_k ограничивает выборку: берутся только k вершин кучи, без сортировки всех целей.
+        """
+        limit = len(self._active_heap) if top_k is None else top_k
+        picked: list[tuple[int, float, str]] = []
+
+        while self._active_heap and len(picked) < limit:
+            entry = heapq.heappop(self._active_heap)
+            goal = self.goals.get(entry[2])
+            if goal is not None and goal.status is GoalStatus.ACTIVE:
+                picked.append(entry)
+
+        for entry in picked:
+            heapq.heappush(self._active_heap, entry)
+
+        return [self.goals[entry[2]].to_dict() for entry in picked]
+
+    def _rebuild_heap(self):
+        self._active_heap = [
+            (-g.priority, -g.created_at, g.id)
+            for g in self.goals.values()
+            if g.status is GoalStatus.ACTIVE
+        ]
+        heapq.heapify(self._active_heap)
+        self._stale = 0
 
     def clear_completed(self):
-        """Очистка памяти от завершенных задач"""
-        self.goals = {k: v for k, v in self.goals.items() if v.status != GoalStatus.COMPLETED.value}
+        """Очистка памяти от завершенных задач (они переносятся в ограниченный архив)"""
+        self._archive.extend(
+            g.to_dict() for g in self.goals.values() if g.status is GoalStatus.COMPLETED
+        )
+        self.goals = {k: v for k, v in self.goals.items() if v.status is not GoalStatus.COMPLETED}
+        self._completed_since_compact = 0
 
     def dump(self):
-        return [g.to_dict() for g in self.goals.values()]
+        return list(self._archive) + [g.to_dict() for g in self.goals.values()]
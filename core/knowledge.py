@@ -1,8 +1,15 @@
+import contextlib
 import hashlib
 import logging
+import os
+import queue
+import threading
 import time
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
 logger = logging.getLogger("KnowledgeBase")
 
 try:
@@ -14,6 +21,11 @@ except ImportError:
     RAG_AVAILABLE = False
     logger.warning("Install: uv add chromadb sentence-transformers")
 
+# Тяжелые ресурсы создаются один раз на процесс и разделяются всеми экземплярами
+_ENCODER: Any = None
+_CLIENTS: dict[str, Any] = {}
+_LOCK = threading.Lock()
+
 
 class KnowledgeBase:
     """
@@ -28,134 +40,501 @@ class KnowledgeBase:
     - Safe fallback
     """
 
+    ENCODER_NAME = "all-MiniLM-L6-v2"
+    # Готовый int8-экспорт из репозитория модели на HF Hub (динамическая квантизация, VNNI)
+    ONNX_INT8_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+    # MiniLM обучался на последовательностях до 128 токенов; длиннее — только лишняя
+    # квадратичная цена внимания
+    ENCODER_MAX_SEQ = 128
+    # Косинусная дистанция, ниже которой запрос считается повтором уже отвеченного
+    RESP_CACHE_DISTANCE = 0.08
+    RESP_CACHE_LIMIT = 512
+    # Сколько живет закэшированный ответ (сек): кэш переживает рестарты,
+    # а даже устойчивые ответы со временем устаревают
+    RESP_CACHE_TTL = 24 * 3600.0
+    RETRIEVE_CACHE_SIZE = 256
+    ENCODE_CACHE_SIZE = 1024
+    WRITE_QUEUE_SIZE = 1024
+    WRITE_BATCH_SIZE = 32
+    ENCODE_BUCKET = 1024
+    # Сколько writer ждет добора батча после первого документа
+    WRITE_LINGER = 0.05
+
     def __init__(self, db_path: str = "./fusion_knowledge"):
         self.db_path = db_path
         self.encoder = None
         self.collection = None
+        self.resp_cache = None
         self.client = None
 
+        # LRU результатов retrieve(): (хэш запроса, top_k) -> готовая строка контекста
+        self._retrieve_cache: OrderedDict[tuple[str, int], str] = OrderedDict()
+        self._retrieve_lock = threading.Lock()
+
+        # LRU эмбеддингов одиночных текстов: хэш текста -> вектор
+        self._encode_cache: OrderedDict[bytes, Any] = OrderedDict()
+        self._encode_lock = threading.Lock()
+
+        # Запись в Chroma (эмбеддинг + insert) уходит с критического пути think()
+        self._write_queue: queue.Queue = queue.Queue(maxsize=self.WRITE_QUEUE_SIZE)
+        self._writer: threading.Thread | None = None
+
+        # Энкодер и Chroma поднимаются в фоне: конструктор не блокирует запуск агента,
+        # а публичные методы дожидаются готовности при первом обращении
+        self._ready = threading.Event()
+
         if RAG_AVAILABLE:
+            threading.Thread(target=self._start, name="KnowledgeBase-boot", daemon=True).start()
+        else:
+            self._ready.set()
+
+    # -------------------------------------------------
+
+    def _start(self) -> None:
+        try:
             self._boot()
 
+            if self.collection:
+                self._writer = threading.Thread(
+                    target=self._writer_loop, name="KnowledgeBase-writer", daemon=True
+                )
+                self._writer.start()
+        finally:
+            self._ready.set()
+
+    # -------------------------------------------------
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        """Дожидается окончания фоновой загрузки. False, если не успела за timeout."""
+        return self._ready.wait(timeout)
+
     # -------------------------------------------------
 
     def _boot(self) -> None:
+        global _ENCODER
+
         try:
-            logger.info("[KB] Loading encoder...")
-            self.encoder = SentenceTransformer("all-MiniLM-L6-v2")
+            with _LOCK:
+                if _ENCODER is None:
+                    logger.info("[KB] Loading encoder...")
+                    _ENCODER = self._load_encoder()
+
+                if self.db_path not in _CLIENTS:
+                    logger.info("[KB] Connecting Chroma...")
+                    _CLIENTS[self.db_path] = chromadb.PersistentClient(path=self.db_path)
 
-            logger.info("[KB] Connecting Chroma...")
-            self.client = chromadb.PersistentClient(path=self.db_path)
+            self.encoder = _ENCODER
+            self.client = _CLIENTS[self.db_path]
 
             self.collection = self.client.get_or_create_collection(
                 name="memory",
                 metadata={"hnsw:space": "cosine"},
             )
 
+            self.resp_cache = self.client.get_or_create_collection(
+                name="resp_cache",
+                metadata={"hnsw:space": "cosine"},
+            )
+
             logger.info("[KB] Ready | Stored: %s", self.collection.count())
 
         except Exception as e:
             logger.error("[KB] Boot failed: %s", e)
             self.collection = None
+            self.resp_cache = None
+
+    # -------------------------------------------------
+
+    def _load_encoder(self) -> "SentenceTransformer":
+        """
+        FUSIONBRAIN_ENCODER_BACKEND=onnx-int8 включает квантованный MiniLM через ONNX Runtime.
+        По умолчанию (и при любой ошибке загрузки) используется PyTorch: FP16 на CUDA,
+        FP32 на CPU. FUSIONBRAIN_EMBED_DEVICE=cpu принудительно отключает GPU (CI, headless).
+        FUSIONBRAIN_EMBED_DTYPE=bf16|fp16|fp32 переопределяет точность (bf16 имеет смысл
+        на CPU с AMX/AVX512-BF16). Векторы для Chroma в любом случае приводятся к FP32.
+        """
+        backend = os.getenv("FUSIONBRAIN_ENCODER_BACKEND", "torch").lower()
+
+        if backend == "onnx-int8":
+            try:
+                encoder = self._load_onnx_int8()
+                encoder.max_seq_length = self.ENCODER_MAX_SEQ
+                return encoder
+            except Exception as e:
+                logger.warning("[KB] ONNX int8 encoder unavailable, using torch: %s", e)
+
+        self._tune_torch_threads()
+
+        device = os.getenv("FUSIONBRAIN_EMBED_DEVICE") or self._default_device()
+        encoder = SentenceTransformer(self.ENCODER_NAME, device=device)
+        encoder.max_seq_length = self.ENCODER_MAX_SEQ
+
+        dtype = os.getenv("FUSIONBRAIN_EMBED_DTYPE", "auto").lower()
+        if dtype == "auto":
+            dtype = "fp16" if device.startswith("cuda") else "fp32"
+
+        if dtype == "fp16":
+            encoder.half()
+        elif dtype == "bf16":
+            import torch
+
+            encoder.to(dtype=torch.bfloat16)
+
+        logger.info("[KB] Encoder device: %s (%s)", device, dtype)
+        return encoder
+
+    # -------------------------------------------------
+
+    def _load_onnx_int8(self) -> "SentenceTransformer":
+        """
+        Порядок: локальный экспорт из FUSIONBRAIN_ONNX_DIR, затем готовый int8-файл с HF Hub.
+        Если нет ни того, ни другого, модель один раз экспортируется в ONNX и квантуется
+        локально (нужен optimum), результат остается в кэше для следующих запусков.
+        """
+        onnx_kwargs = {"file_name": self.ONNX_INT8_FILE, "provider": "CPUExecutionProvider"}
+        export_dir = os.getenv("FUSIONBRAIN_ONNX_DIR") or os.path.join(
+            os.path.expanduser("~"), ".cache", "fusionbrain", self.ENCODER_NAME
+        )
+
+        if os.path.exists(os.path.join(export_dir, self.ONNX_INT8_FILE)):
+            return SentenceTransformer(export_dir, backend="onnx", model_kwargs=onnx_kwargs)
+
+        try:
+            return SentenceTransformer(self.ENCODER_NAME, backend="onnx", model_kwargs=onnx_kwargs)
+        except Exception as e:
+            logger.info("[KB] Hub int8 ONNX file unavailable, exporting locally: %s", e)
+
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        model = SentenceTransformer(self.ENCODER_NAME, backend="onnx")
+        model.save_pretrained(export_dir)
+        export_dynamic_quantized_onnx_model(model, "avx512_vnni", export_dir)
+
+        return SentenceTransformer(export_dir, backend="onnx", model_kwargs=onnx_kwargs)
+
+    # -------------------------------------------------
+
+    @staticmethod
+    def _tune_torch_threads() -> None:
+        """
+        Энкодер вызывают несколько потоков (writer, пул FusionBrain, эксперты):
+        inter-op пул torch сводится к одному потоку, чтобы не было переподписки ядер.
+        FUSIONBRAIN_TORCH_THREADS задает число intra-op потоков явно.
+        """
+        try:
+            import torch
+        except ImportError:
+            return
+
+        threads = os.getenv("FUSIONBRAIN_TORCH_THREADS")
+        if threads:
+            torch.set_num_threads(int(threads))
+
+        # Можно вызвать только до первой параллельной операции torch в процессе
+        with contextlib.suppress(RuntimeError):
+            torch.set_num_interop_threads(1)
+
+    # -------------------------------------------------
+
+    @staticmethod
+    def _default_device() -> str:
+        try:
+            import torch
+
+            return "cuda" if torch.cuda.is_available() else "cpu"
+        except ImportError:
+            return "cpu"
+
+    # -------------------------------------------------
+
+    def _encode(self, text: str) -> Any:
+        """
+        Один и тот же запрос кодируется в think() несколько раз подряд
+        (семантический кэш, retrieve, store_response) — повторные прогоны
+        энкодера отдаются из LRU.
+        """
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+        with self._encode_lock:
+            vec = self._encode_cache.get(key)
+            if vec is not None:
+                self._encode_cache.move_to_end(key)
+                return vec
+
+        vec = self.encode_many([text])[0]
+
+        with self._encode_lock:
+            self._encode_cache[key] = vec
+            if len(self._encode_cache) > self.ENCODE_CACHE_SIZE:
+                self._encode_cache.popitem(last=False)
+
+        return vec
+
+    # -------------------------------------------------
+
+    def encode_many(self, texts: list[str]) -> Any:
+        """
+        Пакетное кодирование. Большие списки сортируются по длине и режутся на корзины
+        по ENCODE_BUCKET текстов: паддинг внутри корзины минимален, пиковая память
+        ограничена, а результат возвращается в исходном порядке.
+        """
+        self.wait_ready()
+
+        if len(texts) <= self.ENCODE_BUCKET:
+            return self._encode_bucket(texts)
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = None
+
+        for start in range(0, len(order), self.ENCODE_BUCKET):
+            idx = order[start : start + self.ENCODE_BUCKET]
+            chunk = self._encode_bucket([texts[i] for i in idx])
+
+            if out is None:
+                out = np.empty((len(texts), chunk.shape[1]), dtype=chunk.dtype)
+            out[idx] = chunk
+
+        return out
+
+    # -------------------------------------------------
+
+    def _encode_bucket(self, texts: list[str]) -> Any:
+        """
+        Эмбеддинги остаются на устройстве энкодера до конца батча и копируются в RAM
+        одним переносом. Для Chroma результат всегда приводится к FP32.
+        Векторы единичной длины: косинус на стороне Chroma сводится к скалярному произведению.
+        """
+        embeddings = self.encoder.encode(
+            texts,
+            batch_size=64,
+            convert_to_tensor=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return embeddings.float().cpu().numpy()
 
     # -------------------------------------------------
 
     @staticmethod
     def _hash(text: str) -> str:
-        return hashlib.sha256(text.strip().lower().encode()).hexdigest()
+        return hashlib.blake2b(text.strip().lower().encode(), digest_size=16).hexdigest()
+
+    # -------------------------------------------------
+
+    def _invalidate_retrieve_cache(self) -> None:
+        with self._retrieve_lock:
+            self._retrieve_cache.clear()
 
     # -------------------------------------------------
 
     def add(
-        self, content: str, category: str = "general", tags: list[str] | None = None
+        self,
+        content: str,
+        category: str = "general",
+        tags: list[str] | None = None,
+        embedding: Any = None,
     ) -> str | None:
+        """
+        Ставит документ в очередь фоновой записи и сразу возвращает его id.
+        Если очередь переполнена, запись выполняется синхронно.
+        Готовый embedding (если уже посчитан вызывающим кодом) повторно не вычисляется.
+        """
+        self.wait_ready()
+
         if not self.collection or not self.encoder:
             return None
 
-        tags = tags or []
+        self._enqueue([(content, category, tags or [], embedding)])
+        return f"{category}:{self._hash(content)}"
 
-        doc_hash = self._hash(content)
-        doc_id = f"{category}:{doc_hash}"
+    # -------------------------------------------------
 
-        try:
-            exists = self.collection.get(ids=[doc_id])
-            if exists and exists["ids"]:
-                return doc_id
+    def add_many(
+        self, contents: list[str], category: str = "general", tags: list[str] | None = None
+    ) -> list[str]:
+        """Асинхронная пакетная запись: все документы уходят в writer одной очередью."""
+        self.wait_ready()
 
-            embedding = self.encoder.encode(content).tolist()
+        if not self.collection or not self.encoder:
+            return []
 
-            meta = {
-                "category": category,
-                "tags": ",".join(tags),
-                "created": time.time(),
-            }
+        tags = tags or []
+        self._enqueue([(content, category, tags, None) for content in contents])
+        return [f"{category}:{self._hash(content)}" for content in contents]
 
-            self.collection.add(
-                ids=[doc_id],
-                documents=[content],
-                embeddings=[embedding],
-                metadatas=[meta],
-            )
+    # -------------------------------------------------
 
-            logger.info("[KB] + %s", content[:40])
+    def _enqueue(self, items: list[tuple[str, str, list[str], Any]]) -> None:
+        overflow: list[tuple[str, str, list[str], Any]] = []
 
-            return doc_id
+        for item in items:
+            try:
+                self._write_queue.put_nowait(item)
+            except queue.Full:
+                overflow.append(item)
 
-        except Exception as e:
-            logger.error("[KB] add(): %s", e)
-            return None
+        if overflow:
+            self._write_batch(overflow)
 
     # -------------------------------------------------
 
     def add_batch(self, texts: list[str], category: str = "general") -> None:
+        self.wait_ready()
+
         if not self.collection or not self.encoder:
             return
 
-        ids: list[str] = []
-        embeddings: list[list[float]] = []
-        metadatas: list[dict] = []
-        documents: list[str] = []
+        self._write_batch([(text, category, [], None) for text in texts])
 
-        for text in texts:
-            h = self._hash(text)
-            doc_id = f"{category}:{h}"
+    # -------------------------------------------------
 
-            try:
-                exists = self.collection.get(ids=[doc_id])
-                if exists and exists["ids"]:
-                    continue
+    def add_if_novel(
+        self,
+        content: str,
+        category: str = "general",
+        tags: list[str] | None = None,
+        threshold: float = 0.15,
+    ) -> str | None:
+        """
+        Семантическая дедупликация: если в той же категории уже есть документ ближе
+        threshold по косинусной дистанции, новый не добавляется и возвращается id старого.
+        """
+        self.wait_ready()
+
+        if not self.collection or not self.encoder:
+            return None
 
-                ids.append(doc_id)
-                embeddings.append(self.encoder.encode(text).tolist())
-                documents.append(text)
-                metadatas.append(
-                    {
-                        "category": category,
-                        "created": time.time(),
-                    }
+        try:
+            embedding = self._encode(content)
+
+            if self.collection.count() > 0:
+                res = self.collection.query(
+                    query_embeddings=[embedding],
+                    n_results=1,
+                    where={"category": category},
                 )
+                dists = res["distances"][0]
+                if dists and dists[0] < threshold:
+                    return res["ids"][0][0]
+
+        except Exception as e:
+            logger.error("[KB] add_if_novel(): %s", e)
+            return None
 
-            except Exception:
-                continue
+        return self.add(content, category=category, tags=tags, embedding=embedding)
 
-        if not ids:
+    # -------------------------------------------------
+
+    def flush(self) -> None:
+        """Дожидается, пока фоновый writer запишет все поставленные в очередь документы."""
+        self.wait_ready()
+
+        if self._writer:
+            self._write_queue.join()
+
+    # -------------------------------------------------
+
+    def _writer_loop(self) -> None:
+        while True:
+            batch = [self._write_queue.get()]
+            deadline = time.monotonic() + self.WRITE_LINGER
+
+            # Короткое ожидание сливает частые одиночные add() в один прогон энкодера
+            while len(batch) < self.WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._write_queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+
+    # -------------------------------------------------
+
+    def _write_batch(self, items: list[tuple[str, str, list[str], Any]]) -> None:
+        # Порядок сохраняется, повторы внутри самого батча отбрасываются
+        candidates: dict[str, tuple[str, str, list[str], Any]] = {}
+        for item in items:
+            candidates.setdefault(f"{item[1]}:{self._hash(item[0])}", item)
+
+        if not candidates:
             return
 
-        self.collection.add(
-            ids=ids,
-            documents=documents,
-            embeddings=embeddings,
-            metadatas=metadatas,
-        )
+        try:
+            # Один запрос к Chroma на весь батч вместо get() на каждый текст
+            existing = set(self.collection.get(ids=list(candidates))["ids"])
+
+            ids = [doc_id for doc_id in candidates if doc_id not in existing]
+            if not ids:
+                return
+
+            documents = [candidates[doc_id][0] for doc_id in ids]
+            now = time.time()
+            metadatas = [
+                {
+                    "category": candidates[doc_id][1],
+                    "tags": ",".join(candidates[doc_id][2]),
+                    "created": now,
+                }
+                for doc_id in ids
+            ]
+
+            # Один батч через энкодер вместо N прогонов с batch size = 1
+            embeddings = [candidates[doc_id][3] for doc_id in ids]
+            missing = [i for i, vec in enumerate(embeddings) if vec is None]
+            if missing:
+                fresh = self.encode_many([documents[i] for i in missing])
+                for i, vec in zip(missing, fresh, strict=True):
+                    embeddings[i] = vec
+
+            # upsert одним вызовом; векторы передаются единым ndarray без .tolist()
+            self.collection.upsert(
+                ids=ids,
+                documents=documents,
+                embeddings=np.stack(embeddings).astype(np.float32, copy=False),
+                metadatas=metadatas,
+            )
+            self._invalidate_retrieve_cache()
+
+            if logger.isEnabledFor(logging.DEBUG):
+                for doc in documents:
+                    logger.debug("[KB] + %s", doc[:40])
+
+        except Exception as e:
+            logger.error("[KB] write: %s", e)
 
     # -------------------------------------------------
 
     def retrieve(self, query: str, top_k: int = 3) -> str:
-        if not self.collection or not self.encoder or self.collection.count() == 0:
+        self.wait_ready()
+
+        if not self.collection or not self.encoder:
             return ""
 
+        # Документы из очереди записи (например, урок прошлого хода) должны быть видны
+        # уже следующему запросу: поиск дожидается writer, а тот сбрасывает LRU
+        if self._write_queue.unfinished_tasks:
+            self.flush()
+
+        if self.collection.count() == 0:
+            return ""
+
+        key = (hashlib.blake2b(query.encode(), digest_size=16).hexdigest(), top_k)
+        with self._retrieve_lock:
+            cached = self._retrieve_cache.get(key)
+            if cached is not None:
+                self._retrieve_cache.move_to_end(key)
+                return cached
+
         try:
-            q_embed = self.encoder.encode(query).tolist()
+            q_embed = self._encode(query)
 
             res = self.collection.query(
                 query_embeddings=[q_embed],
@@ -175,7 +554,14 @@ class KnowledgeBase:
                 cat = metas[i].get("category", "general").upper()
                 out.append(f"[{cat}] {doc}")
 
-            return "\n".join(out)
+            result = "\n".join(out)
+
+            with self._retrieve_lock:
+                self._retrieve_cache[key] = result
+                if len(self._retrieve_cache) > self.RETRIEVE_CACHE_SIZE:
+                    self._retrieve_cache.popitem(last=False)
+
+            return result
 
         except Exception as e:
             logger.error("[KB] retrieve(): %s", e)
@@ -183,7 +569,83 @@ class KnowledgeBase:
 
     # -------------------------------------------------
 
+    def lookup_response(self, prompt: str) -> tuple[str | None, Any]:
+        """
+        Семантический кэш ответов: если похожий запрос уже получал хороший ответ,
+        возвращает его. Вторым элементом отдается эмбеддинг запроса для store_response().
+        """
+        self.wait_ready()
+
+        if not self.resp_cache or not self.encoder:
+            return None, None
+
+        try:
+            q_embed = self._encode(prompt)
+
+            if self.resp_cache.count() == 0:
+                return None, q_embed
+
+            res = self.resp_cache.query(query_embeddings=[q_embed], n_results=1)
+
+            dists = res["distances"][0]
+            if dists and dists[0] < self.RESP_CACHE_DISTANCE:
+                created = (res["metadatas"][0][0] or {}).get("created", 0.0)
+                if time.time() - created < self.RESP_CACHE_TTL:
+                    return res["documents"][0][0], q_embed
+
+                # Просроченный ответ удаляется сразу: следующий ход запишет свежий
+                self.resp_cache.delete(ids=[res["ids"][0][0]])
+
+            return None, q_embed
+
+        except Exception as e:
+            logger.error("[KB] lookup_response(): %s", e)
+            return None, None
+
+    # -------------------------------------------------
+
+    def store_response(self, prompt: str, response: str, embedding: Any = None) -> None:
+        self.wait_ready()
+
+        if not self.resp_cache or not self.encoder or not response:
+            return
+
+        try:
+            if embedding is None:
+                embedding = self._encode(prompt)
+
+            self.resp_cache.upsert(
+                ids=[self._hash(prompt)],
+                documents=[response],
+                embeddings=[embedding],
+                metadatas=[{"prompt": prompt[:500], "created": time.time()}],
+            )
+
+            self._evict_responses()
+
+        except Exception as e:
+            logger.error("[KB] store_response(): %s", e)
+
+    # -------------------------------------------------
+
+    def _evict_responses(self) -> None:
+        """Держит кэш ответов в пределах RESP_CACHE_LIMIT, удаляя самые старые записи."""
+        overflow = self.resp_cache.count() - self.RESP_CACHE_LIMIT
+        if overflow <= 0:
+            return
+
+        res = self.resp_cache.get(include=["metadatas"])
+        by_age = sorted(
+            zip(res["ids"], res["metadatas"], strict=False),
+            key=lambda x: x[1].get("created", 0.0),
+        )
+        self.resp_cache.delete(ids=[doc_id for doc_id, _ in by_age[:overflow]])
+
+    # -------------------------------------------------
+
     def stats(self) -> dict:
+        self.wait_ready()
+
         if not self.collection:
             return {}
 
@@ -195,6 +657,10 @@ class KnowledgeBase:
     # -------------------------------------------------
 
     def clear(self) -> None:
+        self.wait_ready()
+
         if self.client:
             self.client.delete_collection("memory")
+            self.client.delete_collection("resp_cache")
+            self._invalidate_retrieve_cache()
             self._boot()
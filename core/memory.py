@@ -1,9 +1,53 @@
 import json
 import math
+import os
+import re
 import threading
 import time
 import uuid
 from collections import defaultdict, deque
+from itertools import count, islice
+
+import numpy as np
+
+try:
+    import hnswlib
+
+    HNSW_AVAILABLE = True
+except ImportError:
+    HNSW_AVAILABLE = False
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    """L2-нормировка по последней оси: косинус превращается в обычное скалярное произведение."""
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def _dumps(obj) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=_json_default).encode()
+
+
+def _loads(data: bytes):
+    return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
 
 
 class MemoryItem(dict):
@@ -34,6 +78,13 @@ class Memory:
     - future vector db ready
     """
 
+    # С какого числа эмбеддингов поиск переключается с точного matmul на HNSW (если есть hnswlib)
+    ANN_THRESHOLD = 4096
+    # Матрица эмбеддингов хранится в FP16: вдвое меньше памяти и трафика на грубом проходе
+    EMB_DTYPE = np.float16
+    # Сколько кандидатов на каждый из top_k пересчитывается точно в FP32
+    RERANK_FACTOR = 4
+
     def __init__(
         self,
         max_items=512,
@@ -50,19 +101,57 @@ class Memory:
         self.index = {}
         self.topics = defaultdict(set)
         self.stats = defaultdict(int)
+        # Инвертированный индекс для search(): токен -> id записей в порядке вставки
+        self._inv: defaultdict[str, dict[str, None]] = defaultdict(dict)
 
+        # lock охраняет только связку buffer/index/_inv/stats; темы и журнал — свои замки,
+        # а токенизация и сериализация записи выполняются до входа в критическую секцию
         self.lock = threading.Lock()
-        self._last_consolidation = time.time()
+        self._topics_lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        # id записи = случайный префикс экземпляра + счетчик: uuid4 (urandom) берется
+        # один раз, а не на каждую запись; префикс не дает коллизий со снапшотами
+        self._id_prefix = uuid.uuid4().hex[:12]
+        self._id_counter = count()
+        # Интервалы внутри процесса меряются монотонными часами; "ts" остается
+        # wall-clock, потому что сохраняется в снапшоты и переживает рестарт.
+        self._last_consolidation = time.monotonic()
+
+        # Эмбеддинги всех записей одной матрицей (N, D) для поиска одним matmul
+        self._emb_matrix: np.ndarray | None = None
+        self._emb_ids: list[str] = []
+        # Строка матрицы по id и маска живых строк: вытесненные записи гасятся в маске
+        # сразу, без пересборки матрицы на каждое вытеснение
+        self._emb_rows: dict[str, int] = {}
+        self._emb_live: np.ndarray | None = None
+        self._hnsw = None
+
+        # Журнал новых записей (JSONL) рядом со снапшотом: save() пишет снапшот целиком,
+        # а между сохранениями каждая запись дописывается одной строкой.
+        self._snapshot_path: str | None = None
+        self._journal = None
 
     # ---------------- internal ----------------
 
-    def _decay(self, item: MemoryItem):
-        return item.importance * math.exp(-item.age / self.decay_half_life)
+    def _decay(self, item: MemoryItem, now=None):
+        if now is None:
+            now = time.time()
+        return item.importance * math.exp((item["ts"] - now) / self.decay_half_life)
+
+    def _decay_scores(self, items):
+        """_decay() для всего списка сразу: один np.exp вместо math.exp на каждую запись."""
+        size = len(items)
+        ts = np.fromiter((m["ts"] for m in items), dtype=np.float64, count=size)
+        importance = np.fromiter((m.importance for m in items), dtype=np.float64, count=size)
+        return importance * np.exp((ts - time.time()) / self.decay_half_life)
+
+    def _next_id(self):
+        return f"{self._id_prefix}-{next(self._id_counter):x}"
 
     def _make_item(self, role, text, meta=None):
         return MemoryItem(
             {
-                "id": str(uuid.uuid4()),
+                "id": self._next_id(),
                 "role": role,
                 "content": text,
                 "ts": time.time(),
@@ -72,16 +161,73 @@ class Memory:
             }
         )
 
+    @staticmethod
+    def _tokens(item):
+        return set(_TOKEN_RE.findall(item["content"].lower()))
+
+    def _index_tokens(self, item, tokens=None):
+        for token in tokens if tokens is not None else self._tokens(item):
+            self._inv[token][item["id"]] = None
+
+    def _unindex_tokens(self, item):
+        for token in self._tokens(item):
+            postings = self._inv.get(token)
+            if postings is not None:
+                postings.pop(item["id"], None)
+                if not postings:
+                    del self._inv[token]
+
+    def _untopic(self, item):
+        topic = item["meta"].get("topic")
+        if topic:
+            with self._topics_lock:
+                ids = self.topics.get(topic)
+                if ids is not None:
+                    ids.discard(item["id"])
+                    if not ids:
+                        del self.topics[topic]
+
+    def _unembed(self, item):
+        row = self._emb_rows.pop(item["id"], None)
+        if row is not None:
+            self._emb_live[row] = False
+            if self._hnsw is not None:
+                # Метка HNSW = номер строки: удаленная больше не возвращается из knn_query
+                self._hnsw.mark_deleted(row)
+
+    def _rebuild_inv(self):
+        self._inv.clear()
+        for m in self.buffer:
+            self._index_tokens(m)
+
     def _register(self, item):
+        tokens = self._tokens(item)
+        line = _dumps(item) + b"\n" if self._journal is not None else None
+
         with self.lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                # deque вытеснит самую старую запись — она уходит из всех индексов
+                evicted = self.buffer[0]
+                self._unindex_tokens(evicted)
+                self.index.pop(evicted["id"], None)
+                self._untopic(evicted)
+                self._unembed(evicted)
+
             self.buffer.append(item)
+            self._index_tokens(item, tokens)
             self.index[item["id"]] = item
+            self.stats[item["role"]] += 1
 
-            topic = item["meta"].get("topic")
-            if topic:
+        topic = item["meta"].get("topic")
+        if topic:
+            with self._topics_lock:
                 self.topics[topic].add(item["id"])
 
-            self.stats[item["role"]] += 1
+        if line is not None:
+            with self._journal_lock:
+                if self._journal is not None:
+                    self._journal.write(line)
+                    self._journal.flush()
 
     # ---------------- store ----------------
 
@@ -105,20 +251,47 @@ class Memory:
     # ---------------- retrieval ----------------
 
     def recent(self, n=10):
-        return list(self.buffer)[-n:]
+        # Копируется только хвост из n записей, а не весь буфер
+        tail = list(islice(reversed(self.buffer), max(n, 0)))
+        tail.reverse()
+        return tail
 
     def strongest(self, n=10):
-        return sorted(
-            self.buffer,
-            key=lambda x: self._decay(x) * x.get("attention", 1),
-            reverse=True,
-        )[:n]
+        items = list(self.buffer)
+        if not items or n <= 0:
+            return []
+
+        attention = np.fromiter(
+            (m.get("attention", 1) for m in items), dtype=np.float64, count=len(items)
+        )
+        scores = self._decay_scores(items) * attention
+
+        k = min(n, len(items))
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx], kind="stable")]
+
+        return [items[i] for i in idx]
 
     def by_topic(self, topic):
-        return [self.index[x] for x in self.topics.get(topic, [])]
+        index = self.index
+        return [index[x] for x in self.topics.get(topic, ()) if x in index]
 
     def search(self, keyword):
         k = keyword.lower()
+
+        # Для одного слова индекс служит префильтром: кандидаты — записи с токенами,
+        # содержащими запрос ("pyth" -> "python", "код" -> "кода"). Результат подтверждает
+        # прежняя проверка подстроки; без кандидатов и для фраз остается полный скан.
+        if _TOKEN_RE.fullmatch(k):
+            ids = set()
+            with self.lock:
+                for token, postings in self._inv.items():
+                    if k in token:
+                        ids.update(postings)
+
+            if ids:
+                return [m for m in self.buffer if m["id"] in ids and k in m["content"].lower()]
+
         return [m for m in self.buffer if k in m["content"].lower()]
 
     # ---------------- reinforcement ----------------
@@ -134,19 +307,33 @@ class Memory:
     # ---------------- consolidation ----------------
 
     def consolidate(self):
-        now = time.time()
-        if now - self._last_consolidation < self.consolidation_interval:
+        tick = time.monotonic()
+        if tick - self._last_consolidation < self.consolidation_interval:
             return
 
-        survivors = deque(maxlen=self.max_items)
+        self._last_consolidation = tick
 
-        for m in self.buffer:
-            if self._decay(m) > 0.02:
-                survivors.append(m)
+        with self.lock:
+            items = list(self.buffer)
+            keep = self._decay_scores(items) > 0.02 if items else None
+            changed = keep is not None and not keep.all()
+
+            if changed:
+                # Из индексов удаляются только отсеянные записи, без пересборки целиком
+                for i in np.flatnonzero(~keep):
+                    dropped = items[i]
+                    self.index.pop(dropped["id"], None)
+                    self._unindex_tokens(dropped)
+                    self._untopic(dropped)
+
+                self.buffer = deque((items[i] for i in np.flatnonzero(keep)), maxlen=self.max_items)
+
+        if changed:
+            self._rebuild_emb_matrix()
 
-        self.buffer = survivors
-        self.index = {m["id"]: m for m in survivors}
-        self._last_consolidation = now
+        # Граница консолидации — момент свернуть журнал в новый снапшот
+        if self._snapshot_path is not None:
+            self.save(self._snapshot_path)
 
     # ---------------- episodic ----------------
 
@@ -180,13 +367,65 @@ class Memory:
     def dump(self):
         return list(self.buffer)
 
+    @staticmethod
+    def _journal_path(path):
+        return f"{path}.jsonl"
+
+    def _open_journal(self, path, mode):
+        if self._journal is not None:
+            self._journal.close()
+        self._snapshot_path = path
+        self._journal = open(self._journal_path(path), mode)  # noqa: SIM115 — живет вместе с Memory
+
+    @staticmethod
+    def _read_journal(journal):
+        """
+        Записи журнала. Последняя строка, оборванная сбоем посреди дозаписи,
+        отбрасывается и срезается с файла, чтобы следующая запись начиналась с новой строки.
+        """
+        records = []
+        with open(journal, "rb+") as f:
+            lines = f.readlines()
+            good = 0
+            for i, line in enumerate(lines):
+                if line.strip():
+                    try:
+                        records.append(_loads(line))
+                    except ValueError:
+                        if i != len(lines) - 1:
+                            raise
+                        f.truncate(good)
+                        break
+                good += len(line)
+            else:
+                # Целая запись без перевода строки: дописываем его, иначе следующая склеится
+                if lines and not lines[-1].endswith(b"\n"):
+                    f.write(b"\n")
+        return records
+
     def save(self, path):
-        with open(path, "w") as f:
-            json.dump(self.dump(), f, indent=2)
+        """Полный снапшот; журнал после него обнуляется и дальше пишется инкрементально."""
+        with self._journal_lock:
+            with open(path, "wb") as f:
+                f.write(_dumps(self.dump()))
+            self._open_journal(path, "wb")
 
     def load(self, path):
-        with open(path) as f:
-            data = json.load(f)
+        with open(path, "rb") as f:
+            data = _loads(f.read())
+
+        # Записи, добавленные после последнего снапшота
+        journal = self._journal_path(path)
+        if os.path.exists(journal):
+            data.extend(self._read_journal(journal))
+
+        # Запись, попавшая и в снапшот, и в журнал (гонка save/_register), остается одна:
+        # берется версия из журнала и ее позиция
+        records = {}
+        for d in data:
+            records.pop(d["id"], None)
+            records[d["id"]] = d
+        data = list(records.values())
 
         self.buffer.clear()
         self.index.clear()
@@ -200,6 +439,12 @@ class Memory:
             if topic:
                 self.topics[topic].add(item["id"])
 
+        self._rebuild_inv()
+        self._rebuild_emb_matrix()
+
+        with self._journal_lock:
+            self._open_journal(path, "ab")
+
     # ---------------- summaries ----------------
 
     def summary(self, n=20):
@@ -210,16 +455,75 @@ class Memory:
     def embed_hook(self, fn):
         for m in self.buffer:
             m["embedding"] = fn(m["content"])
+        self._rebuild_emb_matrix()
+
+    def _rebuild_emb_matrix(self):
+        items = [
+            m for m in self.buffer if m.get("embedding") is not None and len(m["embedding"]) > 0
+        ]
+        self._emb_ids = [m["id"] for m in items]
+        self._emb_rows = {item_id: row for row, item_id in enumerate(self._emb_ids)}
+        self._emb_live = np.ones(len(items), dtype=bool)
+        self._emb_matrix = None
+        self._hnsw = None
+
+        if not items:
+            return
+
+        # Строки нормируются один раз здесь, а не при каждом запросе
+        unit = _normalize(np.asarray([m["embedding"] for m in items], dtype=np.float32))
+        self._emb_matrix = unit.astype(self.EMB_DTYPE)
+
+        if HNSW_AVAILABLE and len(items) >= self.ANN_THRESHOLD:
+            n, dim = unit.shape
+            # 'ip' на единичных векторах = косинус; метки = номера строк матрицы
+            self._hnsw = hnswlib.Index(space="ip", dim=dim)
+            self._hnsw.init_index(max_elements=n, ef_construction=64, M=16)
+            self._hnsw.add_items(unit, np.arange(n))
 
     def similarity(self, vec, top_k=5):
-        scored = []
-        for m in self.buffer:
-            emb = m.get("embedding")
-            if not emb:
-                continue
-            dot = sum(a * b for a, b in zip(vec, emb, strict=False))
-            scored.append((dot, m))
-        return [x[1] for x in sorted(scored, reverse=True)[:top_k]]
+        if self._emb_matrix is None or top_k <= 0:
+            return []
+
+        vec = _normalize(np.asarray(vec, dtype=np.float32))
+
+        live = len(self._emb_rows)
+        if live == 0:
+            return []
+
+        if self._hnsw is not None:
+            k = min(top_k, live)
+            self._hnsw.set_ef(max(k * 2, 40))
+            try:
+                labels, _ = self._hnsw.knn_query(vec, k=k)
+            except RuntimeError:
+                # После множества удалений граф может не набрать k соседей — точный проход ниже
+                labels = None
+
+            if labels is not None:
+                items = (self.index.get(self._emb_ids[i]) for i in labels[0])
+                return [m for m in items if m is not None]
+
+        # грубый проход в FP16 по всей матрице; вытесненные строки не участвуют
+        scores = (self._emb_matrix @ vec.astype(self.EMB_DTYPE)).astype(np.float32)
+        scores[~self._emb_live] = -np.inf
+
+        n = min(top_k * self.RERANK_FACTOR, live)
+        cand = np.argpartition(-scores, n - 1)[:n]
+
+        # точный пересчёт кандидатов по исходным FP32-векторам; запись могла быть
+        # вытеснена параллельным store() уже после маски — такие пропускаются
+        items = [self.index.get(self._emb_ids[i]) for i in cand]
+        items = [m for m in items if m is not None]
+        if not items:
+            return []
+
+        rows = np.asarray([m["embedding"] for m in items], dtype=np.float32)
+        exact = _normalize(rows) @ vec
+
+        order = np.argsort(-exact)[:top_k]
+
+        return [items[i] for i in order]
 
     # ---------------- introspection ----------------
 
@@ -237,3 +541,9 @@ class Memory:
         self.index.clear()
         self.topics.clear()
         self.stats.clear()
+        self._inv.clear()
+        self._emb_matrix = None
+        self._emb_ids = []
+        self._emb_rows = {}
+        self._emb_live = None
+        self._hnsw = None
@@ -20,7 +20,7 @@ class SelfState:
         self.confidence: float = 0.5
         self.focus: float = 1.0
 
-        self.last_update = time.time()
+        self.last_update = time.monotonic()
 
         self.decay_rate = 0.05
 
@@ -64,7 +64,7 @@ class SelfState:
 
     def _natural_decay(self):
         """Эмуляция восстановления со временем (если агент простаивает)."""
-        now = time.time()
+        now = time.monotonic()
         delta = now - self.last_update
 
         if delta > 10:
@@ -115,7 +115,9 @@ if prompt:
         with st.status("Running Cognitive Pipeline...", expanded=True) as status:
             try:
                 # ЛОГИКА ВЫБОРА АГЕНТА
-                if mode == "🕵️‍♂️ Research" or prompt.strip().startswith("/research"):
+                research = mode == "🕵️‍♂️ Research" or prompt.strip().startswith("/research")
+
+                if research:
                     st.write("🕵️‍♂️ Engaging Autonomous Research Agent...")
                     clean_prompt = prompt.replace("/research", "").strip() or prompt
 
@@ -128,15 +130,17 @@ if prompt:
                     time.sleep(0.2)
                     st.write("🧠 Reasoning & Simulation...")
 
-                    # Запуск обычного мышления
-                    response = st.session_state.brain.think(prompt)
+                    # Запуск обычного мышления: ответ печатается по мере генерации
+                    with message_placeholder.container():
+                        response = st.write_stream(st.session_state.brain.think_stream(prompt))
                     status.update(label="Reasoning Complete", state="complete")
 
                 # Сохраняем "сырой" ответ для анализа в сайдбаре
                 st.session_state.last_thought_process = response
 
-                # Вывод ответа
-                message_placeholder.markdown(response)
+                # Вывод ответа (обычный ответ уже отрисован потоком)
+                if research:
+                    message_placeholder.markdown(response)
 
                 # Сохраняем в историю чата
                 st.session_state.messages.append({"role": "assistant", "content": response})
@@ -1,11 +1,48 @@
+import json
 import logging
-import subprocess
+import os
+import threading
 import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+import requests
+from requests.adapters import HTTPAdapter
+
 logger = logging.getLogger(__name__)
 
+OLLAMA_URL = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+KEEP_ALIVE = "30m"
+TIMEOUT = 120.0
+
+# Одна сессия на процесс: все эксперты делят пул keep-alive соединений с Ollama
+# вместо запуска `ollama run` (fork + exec + разбор аргументов) на каждый вызов.
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=16))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=16))
+
+# Пул для независимых запросов к модели изнутри эксперта (_ask_model_many): вызовы
+# упираются в сеть и Ollama, так что потоки перекрывают ожидание
+# (для реального выигрыша — OLLAMA_NUM_PARALLEL > 1).
+_LLM_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="LLM")
+
+# Счетчик сбоев обращения к модели (HTTP-ошибка, недоступность Ollama, исключение эксперта).
+# Ошибки возвращаются пользователю текстом, поэтому признак сбоя нужен отдельно от ответа:
+# FusionBrain сравнивает значение до и после хода и не кэширует ответ, если счетчик сдвинулся.
+_FAILURES = 0
+_FAILURES_LOCK = threading.Lock()
+
+
+def note_failure() -> None:
+    global _FAILURES
+    with _FAILURES_LOCK:
+        _FAILURES += 1
+
+
+def failure_count() -> int:
+    return _FAILURES
+
 
 class BaseExpert:
     def __init__(self, name: str, description: str, version: str = "1.0", model_name: str = ""):
@@ -20,7 +57,7 @@ class BaseExpert:
         Обертка с логированием и обработкой ошибок.
         """
         start_time = time.time()
-        logger.info(f"[{self.name}] Started processing request.")
+        logger.debug("[%s] Started processing request.", self.name)
 
         if not self._validate_context(context):
             return f"[{self.name}] Context invalid: 'prompt' missing."
@@ -29,18 +66,28 @@ class BaseExpert:
             result = self._perform_task(context)
 
             elapsed = time.time() - start_time
-            logger.info(f"[{self.name}] Finished in {elapsed:.4f}s.")
+            logger.debug("[%s] Finished in %.4fs.", self.name, elapsed)
             return result
 
         except NotImplementedError:
             error_msg = f"[{self.name}] Critical: Expert logic not implemented."
             logger.error(error_msg)
+            note_failure()
             return error_msg
 
         except Exception as e:
             logger.error(f"[{self.name}] CRITICAL ERROR: {e}", exc_info=True)
+            note_failure()
             return f"[{self.name}] Error: {str(e)}"
 
+    def run_stream(self, context: dict[str, Any]) -> Iterator[str]:
+        """
+        Потоковая версия run() с тем же запросом к модели; меняется только доставка.
+        По умолчанию ответ отдается одним куском, эксперты с одиночным вызовом
+        модели переопределяют метод и стримят токены.
+        """
+        yield self.run(context)
+
     def _perform_task(self, context: dict[str, Any]) -> str:
         """
         Метод, который должны реализовать наследники, если они используют базовый run().
@@ -54,45 +101,95 @@ class BaseExpert:
         """Проверка наличия промпта в контексте."""
         return isinstance(context, dict) and "prompt" in context
 
+    def _build_payload(self, prompt: str, system_prompt: str, stream: bool) -> dict[str, Any]:
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+
+        return {
+            "model": self.model_name,
+            "messages": messages,
+            "stream": stream,
+            "keep_alive": KEEP_ALIVE,
+        }
+
     def _ask_model(self, prompt: str, system_prompt: str = "") -> str:
         """
-        Отправляет запрос в локальную LLM через Ollama (Subprocess).
+        Отправляет запрос в локальную LLM через HTTP API Ollama (/api/chat).
         """
         if not self.model_name:
             return "[System] No model configured for this expert."
 
-        full_prompt = prompt
-        if system_prompt:
-            full_prompt = f"System: {system_prompt}\nUser: {prompt}"
-
-        cmd = ["ollama", "run", self.model_name]
+        payload = self._build_payload(prompt, system_prompt, stream=False)
 
         try:
-            proc = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                bufsize=1,
-                universal_newlines=True,
-                encoding="utf-8",
-                errors="replace",
-            )
-
-            stdout, stderr = proc.communicate(input=full_prompt)
-
-            if proc.returncode != 0:
-                logger.error(f"[{self.name}] Ollama Error: {stderr}")
-                return f"Error from model: {stderr}"
-
-            return stdout.strip()
-
-        except FileNotFoundError:
-            return "Error: Ollama not found. Please install Ollama CLI."
+            resp = _SESSION.post(f"{OLLAMA_URL}/api/chat", json=payload, timeout=TIMEOUT)
+
+            if resp.status_code != 200:
+                logger.error(f"[{self.name}] Ollama Error: {resp.text}")
+                note_failure()
+                return f"Error from model: {resp.text}"
+
+            return resp.json()["message"]["content"].strip()
+
+        except requests.ConnectionError:
+            note_failure()
+            return f"Error: Ollama is not reachable at {OLLAMA_URL}."
         except Exception as e:
             logger.error(f"[{self.name}] LLM Connection Error: {e}")
+            note_failure()
             return f"Error calling model: {e}"
 
+    def _ask_model_many(self, requests_: Iterable[tuple[str, str]]) -> list[str]:
+        """
+        Несколько независимых _ask_model одновременно.
+        Принимает пары (prompt, system_prompt), ответы возвращаются в том же порядке.
+        """
+        return list(_LLM_POOL.map(lambda req: self._ask_model(*req), requests_))
+
+    def _ask_model_stream(self, prompt: str, system_prompt: str = "") -> Iterator[str]:
+        """
+        Потоковый вариант _ask_model: отдает вывод модели по мере генерации.
+        Если потребитель закрывает генератор досрочно, HTTP-ответ закрывается
+        и Ollama прекращает генерацию.
+        """
+        if not self.model_name:
+            yield "[System] No model configured for this expert."
+            return
+
+        payload = self._build_payload(prompt, system_prompt, stream=True)
+
+        try:
+            with _SESSION.post(
+                f"{OLLAMA_URL}/api/chat", json=payload, stream=True, timeout=TIMEOUT
+            ) as resp:
+                if resp.status_code != 200:
+                    logger.error(f"[{self.name}] Ollama Error: {resp.text}")
+                    note_failure()
+                    yield f"Error from model: {resp.text}"
+                    return
+
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+
+                    chunk = json.loads(line)
+                    piece = chunk.get("message", {}).get("content", "")
+                    if piece:
+                        yield piece
+
+                    if chunk.get("done"):
+                        break
+
+        except requests.ConnectionError:
+            note_failure()
+            yield f"Error: Ollama is not reachable at {OLLAMA_URL}."
+        except Exception as e:
+            logger.error(f"[{self.name}] LLM Stream Error: {e}")
+            note_failure()
+            yield f"Error calling model: {e}"
+
     def get_info(self) -> dict[str, str]:
         return {
             "name": self.name,
@@ -1,18 +1,30 @@
-import ast
 import logging
-import os
 import re
 import subprocess
-import sys
-import tempfile
 from typing import Any
 
+from fusionbrain.utils.sandbox import Sandbox
+
 from .base_expert import BaseExpert
 
 logger = logging.getLogger(__name__)
 
+# Все запрещенные конструкции одной альтернацией: один проход по коду вместо пяти
+_FORBIDDEN_RE = re.compile(r"shutil\.rmtree|os\.remove|os\.rmdir|subprocess\.call|rm -rf")
+
+# Слова-триггеры исполнения кода; совпадение по подстроке без учета регистра, за один проход
+_EXECUTE_RE = re.compile(
+    r"выполни|execute|run|запусти|посчитай|calculate|test",
+    re.IGNORECASE,
+)
+
 
 class CodeExpert(BaseExpert):
+    CODEGEN_SYSTEM = (
+        "Write pure Python code. No markdown, no explanations. Just code. "
+        "Use standard libraries where possible."
+    )
+
     def __init__(self):
         super().__init__(
             name="CodeExpert",
@@ -50,11 +62,7 @@ class CodeExpert(BaseExpert):
         return self.run(context)
 
     def _generate_code(self, prompt: str) -> str:
-        system = (
-            "Write pure Python code. No markdown, no explanations. Just code. "
-            "Use standard libraries where possible."
-        )
-        response = self._ask_model(prompt, system_prompt=system)
+        response = self._ask_model(prompt, system_prompt=self.CODEGEN_SYSTEM)
 
         # Очистка от ```python ... ```
         clean_code = response.replace("```python", "").replace("```", "").strip()
@@ -62,12 +70,11 @@ class CodeExpert(BaseExpert):
 
     def _should_execute(self, prompt: str) -> bool:
         """Определяет, нужно ли выполнять код."""
-        triggers = ["выполни", "execute", "run", "запусти", "посчитай", "calculate", "test"]
-        return any(w in prompt.lower() for w in triggers)
+        return _EXECUTE_RE.search(prompt) is not None
 
     def _execute_sandbox(self, code: str) -> str:
         """
-        Безопасное выполнение кода через временный файл и subprocess.
+        Безопасное выполнение кода в отдельном процессе (см. utils.sandbox).
         """
         logger.info("Spinning up Sandbox Container...")
 
@@ -75,32 +82,16 @@ class CodeExpert(BaseExpert):
         if self._is_dangerous(code):
             return "❌ Security Alert: Code contains forbidden commands (rm, system, etc)."
 
-        # Создаем временный файл
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as tmp:
-            tmp.write(code)
-            tmp_path = tmp.name
-
         try:
-            # Запускаем в отдельном процессе с тайм-аутом 5 сек
-            result = subprocess.run(
-                [sys.executable, tmp_path],
-                capture_output=True,
-                text=True,
-                timeout=5,
-            )
-            output = result.stdout + result.stderr
+            # Тайм-аут 5 сек
+            output, _ = Sandbox.run(code, timeout=5)
         except subprocess.TimeoutExpired:
             output = "❌ TimeoutError: Code execution took too long (>5s)."
         except Exception as e:
             output = f"❌ Sandbox Error: {e}"
-        finally:
-            # Удаляем улики
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
 
         return output.strip() or "[No Output]"
 
     def _is_dangerous(self, code: str) -> bool:
         """Простейшая стат. проверка на rm -rf и прочее."""
-        forbidden = ["shutil.rmtree", "os.remove", "os.rmdir", "subprocess.call", "rm -rf"]
-        return any(cmd in code for cmd in forbidden)
+        return _FORBIDDEN_RE.search(code) is not None
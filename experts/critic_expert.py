@@ -1,19 +1,36 @@
 import ast
+import hashlib
 import logging
 import re
 import subprocess
-import sys
-import tempfile
-from contextlib import suppress
-from pathlib import Path
+from collections import OrderedDict
+from collections.abc import Iterator
 from typing import Any
 
+from fusionbrain.utils.sandbox import Sandbox
+
 from .base_expert import BaseExpert
 
 logger = logging.getLogger(__name__)
 
+_CODE_BLOCK_RE = re.compile(r"```python(.*?)```", re.DOTALL)
+
+# запрещаем только опасное для генерируемого кода
+_FORBIDDEN_IMPORTS = frozenset({"subprocess", "socket", "requests", "shutil"})
+
 
 class CriticExpert(BaseExpert):
+    # Вердикт в самом начале ответа позволяет прервать генерацию, как только он получен
+    TEXT_CRITIQUE_SYSTEM = (
+        "Be strict. Start with exactly one line: [VERDICT]: PASS or [VERDICT]: FAIL. "
+        "If FAIL, explain the problems after it."
+    )
+    TEST_GEN_SYSTEM = (
+        "You are QA automation. Generate ONLY python unittest code. "
+        "No markdown. No comments."
+    )
+    SAFETY_CACHE_SIZE = 256
+
     def __init__(self):
         super().__init__(
             name="CriticExpert",
@@ -22,13 +39,10 @@ class CriticExpert(BaseExpert):
             model_name="qwen2.5-coder:32b",
         )
 
-        # запрещаем только опасное для генерируемого кода
-        self.forbidden_imports = {
-            "subprocess",
-            "socket",
-            "requests",
-            "shutil",
-        }
+        self.forbidden_imports = _FORBIDDEN_IMPORTS
+
+        # Ретраи критикуют тот же код повторно: вердикт AST-проверки кэшируется по хэшу
+        self._safety_cache: OrderedDict[bytes, bool] = OrderedDict()
 
     # -----------------------------------------------------
 
@@ -36,7 +50,7 @@ class CriticExpert(BaseExpert):
         candidate_solution = context.get("prev_output", "")
         prompt = context.get("prompt", "")
 
-        code_match = re.search(r"```python(.*?)```", candidate_solution, re.DOTALL)
+        code_match = _CODE_BLOCK_RE.search(candidate_solution)
 
         if not code_match:
             return self._text_critique(candidate_solution)
@@ -70,32 +84,37 @@ if __name__ == "__main__":
 
     # -----------------------------------------------------
 
-    def _generate_test(self, task_prompt: str, code: str) -> str:
-        system = (
-            "You are QA automation. Generate ONLY python unittest code. "
-            "No markdown. No comments."
+    def run_stream(self, context: dict[str, Any]) -> Iterator[str]:
+        """
+        Потоковая версия run(). Текстовая критика отдается по мере генерации,
+        чтобы вызывающий код мог остановиться на первом вердикте.
+        Проверка кода тестами не стримится и отдается одним куском.
+        """
+        candidate_solution = context.get("prev_output", "")
+
+        if _CODE_BLOCK_RE.search(candidate_solution):
+            yield self.run(context)
+            return
+
+        yield from self._ask_model_stream(
+            f"Critique this text:\n{candidate_solution}",
+            system_prompt=self.TEXT_CRITIQUE_SYSTEM,
         )
 
+    # -----------------------------------------------------
+
+    def _generate_test(self, task_prompt: str, code: str) -> str:
         user = f"TASK:\n{task_prompt}\n\nCODE:\n{code}"
 
-        resp = self._ask_model(user, system_prompt=system)
+        resp = self._ask_model(user, system_prompt=self.TEST_GEN_SYSTEM)
         return resp.replace("```python", "").replace("```", "").strip()
 
     # -----------------------------------------------------
 
     def _execute_sandbox(self, code: str) -> tuple[str, int]:
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as tmp:
-            tmp.write(code)
-            tmp_path = Path(tmp.name)
-
         try:
-            result = subprocess.run(
-                [sys.executable, str(tmp_path)],
-                capture_output=True,
-                text=True,
-                timeout=10,
-            )
-            return (result.stdout + result.stderr).strip(), result.returncode
+            output, returncode = Sandbox.run(code, timeout=10)
+            return output.strip(), returncode
 
         except subprocess.TimeoutExpired:
             return "Timeout exceeded", 1
@@ -103,36 +122,58 @@ if __name__ == "__main__":
         except Exception as e:
             return str(e), 1
 
-        finally:
-            with suppress(Exception):
-                tmp_path.unlink(missing_ok=True)
-
     # -----------------------------------------------------
 
     def _text_critique(self, text: str) -> str:
         return self._ask_model(
             f"Critique this text:\n{text}",
-            system_prompt="Be strict.",
+            system_prompt=self.TEXT_CRITIQUE_SYSTEM,
         )
 
     # -----------------------------------------------------
 
     def _is_safe(self, code: str) -> bool:
-        try:
-            tree = ast.parse(code)
+        key = hashlib.blake2b(code.encode(), digest_size=16).digest()
 
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for a in node.names:
-                        if a.name.split(".")[0] in self.forbidden_imports:
-                            return False
+        cached = self._safety_cache.get(key)
+        if cached is not None:
+            self._safety_cache.move_to_end(key)
+            return cached
 
-                if isinstance(node, ast.ImportFrom):
-                    if node.module and node.module.split(".")[0] in self.forbidden_imports:
-                        return False
+        safe = self._check_imports(code)
+
+        self._safety_cache[key] = safe
+        if len(self._safety_cache) > self.SAFETY_CACHE_SIZE:
+            self._safety_cache.popitem(last=False)
+
+        return safe
 
+    # -----------------------------------------------------
+
+    def _check_imports(self, code: str) -> bool:
+        # Без слова import в тексте не может быть ни одного узла Import/ImportFrom
+        if "import" not in code:
             return True
 
+        try:
+            tree = ast.parse(code)
         except Exception as e:
-            logger.warning(f"AST failure: {e}")
+            logger.warning("AST failure: %s", e)
             return False
+
+        forbidden = self.forbidden_imports
+
+        # Один проход по дереву; точная проверка класса дешевле цепочки isinstance
+        for node in ast.walk(tree):
+            node_type = node.__class__
+
+            if node_type is ast.Import:
+                for a in node.names:
+                    if a.name.split(".")[0] in forbidden:
+                        return False
+
+            elif node_type is ast.ImportFrom:
+                if node.module and node.module.split(".")[0] in forbidden:
+                    return False
+
+        return True
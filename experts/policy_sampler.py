@@ -1,13 +1,33 @@
 import json
 import logging
+import re
 from typing import Any
 
 from .base_expert import BaseExpert
 
 logger = logging.getLogger(__name__)
 
+# Ключевые слова запасного роутинга: одна регулярка, группа = маршрут
+_ROUTE_RE = re.compile(
+    r"(?P<CODING>код|code|python|script)|(?P<RESEARCH>поиск|найди|research|кто|когда)",
+    re.IGNORECASE,
+)
+_ROUTES = {
+    "CODING": {"intent": "CODING", "expert": "CodeExpert", "difficulty": 5},
+    "RESEARCH": {"intent": "RESEARCH", "expert": "ResearchExpert", "difficulty": 3},
+}
+_DEFAULT_ROUTE = {"intent": "REASONING", "expert": "ReasoningExpert", "difficulty": 5}
+
 
 class PolicySampler(BaseExpert):
+    ROUTER_SYSTEM = (
+        "You are the brain's router. Analyze the user prompt. "
+        "Classify into one of: [CODING, RESEARCH, REASONING, CHAT]. "
+        "Select the best expert: [CodeExpert, ResearchExpert, ReasoningExpert]. "
+        "Estimate difficulty (1-10). "
+        'Return JSON ONLY: {"intent": "...", "expert": "...", "difficulty": int}'
+    )
+
     def __init__(self):
         super().__init__(
             name="PolicySampler",
@@ -21,37 +41,29 @@ class PolicySampler(BaseExpert):
         Определяет намерение пользователя и сложность задачи.
         Возвращает JSON: { "intent":Str, "difficulty":Int, "expert":Str }
         """
-        system_prompt = (
-            "You are the brain's router. Analyze the user prompt. "
-            "Classify into one of: [CODING, RESEARCH, REASONING, CHAT]. "
-            "Select the best expert: [CodeExpert, ResearchExpert, ReasoningExpert]. "
-            "Estimate difficulty (1-10). "
-            'Return JSON ONLY: {"intent": "...", "expert": "...", "difficulty": int}'
-        )
-
         try:
             # Быстрый запрос к LLM
-            response = self._ask_model(prompt, system_prompt)
+            response = self._ask_model(prompt, self.ROUTER_SYSTEM)
 
-            # Чистим JSON
-            clean_json = response.replace("```json", "").replace("```", "").strip()
-            if "{" not in clean_json:
+            # Берем объект от первой { до последней }: обертка ```json и текст вокруг отпадают
+            start = response.find("{")
+            end = response.rfind("}")
+            if start == -1 or end < start:
                 raise ValueError("No JSON")
 
-            data = json.loads(clean_json)
-            return data
+            return json.loads(response[start : end + 1])
         except Exception as e:
-            logger.warning(f"Routing failed, fallback to rules. Error: {e}")
+            logger.warning("Routing failed, fallback to rules. Error: %s", e)
             return self._fallback_routing(prompt)
 
     def _fallback_routing(self, prompt: str) -> dict:
-        """Запасной вариант на if/else, если LLM выдала мусор."""
-        p = prompt.lower()
-        if any(w in p for w in ["код", "code", "python", "script"]):
-            return {"intent": "CODING", "expert": "CodeExpert", "difficulty": 5}
-        if any(w in p for w in ["поиск", "найди", "research", "кто", "когда"]):
-            return {"intent": "RESEARCH", "expert": "ResearchExpert", "difficulty": 3}
-        return {"intent": "REASONING", "expert": "ReasoningExpert", "difficulty": 5}
+        """Запасной вариант на правилах, если LLM выдала мусор."""
+        # Один проход по промпту; CODING приоритетнее RESEARCH, как и раньше
+        found = {m.lastgroup for m in _ROUTE_RE.finditer(prompt)}
+        for route in ("CODING", "RESEARCH"):
+            if route in found:
+                return dict(_ROUTES[route])
+        return dict(_DEFAULT_ROUTE)
 
     def run(self, context: dict) -> str:
         # Этот метод для совместимости, основная логика теперь в classify_intent
@@ -1,4 +1,5 @@
 import logging
+from collections.abc import Iterator
 from typing import Any
 
 from .base_expert import BaseExpert
@@ -7,6 +8,9 @@ logger = logging.getLogger(__name__)
 
 
 class ReasoningExpert(BaseExpert):
+    COT_SYSTEM = "Think step-by-step."
+    COT_HEADER = "### Linear Reasoning (CoT)\n"
+
     def __init__(self, brain_ref: Any):
         super().__init__(
             name="ReasoningExpert",
@@ -25,12 +29,28 @@ class ReasoningExpert(BaseExpert):
 
         return self._chain_of_thought(prompt)
 
+    def run_stream(self, context: dict[str, Any]) -> Iterator[str]:
+        """
+        Потоковая версия run(): CoT отдается по мере генерации тем же запросом,
+        Tree-of-Thought выбирает лучшую ветку только в конце и отдается одним куском.
+        """
+        prompt = context.get("prompt", "")
+        policy = context.get("policy", {"method": "cot"})
+
+        if policy.get("method") == "tot":
+            yield self._tree_of_thought(prompt, policy)
+            return
+
+        logger.info("Executing Chain-of-Thought (stream)...")
+        yield self.COT_HEADER
+        yield from self._ask_model_stream(prompt, system_prompt=self.COT_SYSTEM)
+
     # -----------------------------------------------------
 
     def _chain_of_thought(self, prompt: str) -> str:
         logger.info("Executing Chain-of-Thought...")
-        response = self._ask_model(prompt, system_prompt="Think step-by-step.")
-        return f"### Linear Reasoning (CoT)\n{response}"
+        response = self._ask_model(prompt, system_prompt=self.COT_SYSTEM)
+        return f"{self.COT_HEADER}{response}"
 
     # -----------------------------------------------------
 
@@ -38,25 +58,23 @@ class ReasoningExpert(BaseExpert):
         branches = int(policy.get("branches", 3))
         logger.info("Executing Tree-of-Thought with %s branches...", branches)
 
-        candidates: list[str] = []
-
-        for i in range(branches):
-            thought = self._ask_model(
-                prompt,
-                system_prompt=f"Generate distinct approach #{i+1}. Be concise.",
+        # Ветки и их оценки независимы: каждая стадия уходит к модели одним залпом
+        candidates = self._ask_model_many(
+            (prompt, f"Generate distinct approach #{i+1}. Be concise.") for i in range(branches)
+        )
+        score_strs = self._ask_model_many(
+            (
+                f"Evaluate from 0 to 10. Return ONLY number.\nSolution:\n{thought}",
+                "Strict verifier.",
             )
-            candidates.append(thought)
+            for thought in candidates
+        )
 
         best_thought = ""
         best_score = -1.0
         report: list[str] = []
 
-        for i, thought in enumerate(candidates):
-            score_str = self._ask_model(
-                f"Evaluate from 0 to 10. Return ONLY number.\nSolution:\n{thought}",
-                system_prompt="Strict verifier.",
-            )
-
+        for i, (thought, score_str) in enumerate(zip(candidates, score_strs, strict=True)):
             try:
                 score = float(score_str.strip())
             except ValueError:
@@ -2,6 +2,7 @@ import json
 import logging
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Union
 
 try:
@@ -11,16 +12,26 @@ try:
 except ImportError:
     GITHUB_AVAILABLE = False
 
-
-import wikipedia
-from duckduckgo_search import DDGS
+from fusionbrain.utils.web_search import WebSearch
 
 from .base_expert import BaseExpert
 
 logger = logging.getLogger(__name__)
 
+# Поиск в DDG и в Википедии идут параллельно: запасной вариант уже готов, когда нужен
+_FETCH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ResearchFetch")
+
 
 class ResearchExpert(BaseExpert):
+    RELEVANCE_SYSTEM = (
+        "You are a technical filter for an AGI project."
+        "Evaluate relevance (0-10) of the content for a developer."
+        'Return raw JSON: {"score": int, "reason": "string"}.'
+    )
+
+    # Сколько живет кэш заголовков открытых issue (сек)
+    ISSUE_CACHE_TTL = 300.0
+
     def __init__(self, brain_ref):
         super().__init__(
             name="ResearchExpert",
@@ -36,12 +47,16 @@ class ResearchExpert(BaseExpert):
         if GITHUB_AVAILABLE and self.github_token:
             self.gh_client = Github(self.github_token)
 
+        # Заголовки открытых issue: одна пагинация по API на TTL, а не на каждую находку
+        self._open_issue_titles: set[str] | None = None
+        self._issues_fetched_at = 0.0
+
     def run(self, params: str | dict[str, Any]) -> str:
         raw_topic = params.get("prompt", "") if isinstance(params, dict) else str(params)
 
         topic = raw_topic.strip(" .?!")
 
-        logger.info(f"Starting research on: {topic}")
+        logger.info("Starting research on: %s", topic)
         print(f"\n[ResearchExpert] 🕵️‍♂️ Analyzing topic: '{topic}'...")
 
         results = self._fetch_data_hybrid(topic)
@@ -52,16 +67,23 @@ class ResearchExpert(BaseExpert):
         report = []
         print(f"[ResearchExpert] Found {len(results)} sources. AI Filtering started...")
 
-        for item in results[:5]:
+        top = results[:5]
+
+        # Оценки источников независимы: все запросы к модели уходят одновременно
+        verdicts = self._ask_model_many(
+            (
+                f"Topic: {item.get('title', 'No Title')}\nDetails: {item.get('body', '')}",
+                self.RELEVANCE_SYSTEM,
+            )
+            for item in top
+        )
+
+        for item, raw_response in zip(top, verdicts, strict=True):
             title = item.get("title", "No Title")
             snippet = item.get("body", "")
             link = item.get("href", "")
 
-            try:
-                score, reason = self._evaluate_relevance(title, snippet)
-            except Exception as e:
-                logger.error(f"Evaluation failed: {e}")
-                continue
+            score, reason = self._parse_relevance(title, raw_response)
 
             if score < 5:
                 print(f"   🗑️ [Skip] {title[:30]}... (Score: {score})")
@@ -79,7 +101,6 @@ class ResearchExpert(BaseExpert):
             report.append(
                 f"### {title} (Score: {score}/10)\n_{reason}_\n> {snippet[:200]}...\n[Source]({link})\n"
             )
-            time.sleep(0.2)
 
         return "\n".join(report) if report else "Found nothing relevant enough."
 
@@ -89,48 +110,38 @@ class ResearchExpert(BaseExpert):
         1. DuckDuckGo (свежие новости).
         2. Если пусто -> Wikipedia (базовые знания).
         """
+        # Википедия запрашивается сразу, не дожидаясь DDG; ее ответ берется, только если DDG мало
+        wiki_future = _FETCH_POOL.submit(self._fetch_wikipedia, query)
+
         results = []
 
         try:
-            with DDGS() as ddgs:
-                ddg_gen = ddgs.text(query, max_results=5, backend="lite")
-                if ddg_gen:
-                    results = list(ddg_gen)
-                    print(f"   [Source] DuckDuckGo returned {len(results)} results.")
+            results = WebSearch.ddg_text(query, max_results=5, backend="lite")
+            if results:
+                print(f"   [Source] DuckDuckGo returned {len(results)} results.")
         except Exception as e:
             logger.warning(f"DDG Search failed: {e}")
 
         if len(results) < 2:
             print("   [Source] Engaging Wikipedia fallback...")
-            try:
-                wikipedia.set_lang("en")
-
-                wiki_pages = wikipedia.search(query, results=2)
-
-                for page_name in wiki_pages:
-                    try:
-                        summary = wikipedia.summary(page_name, sentences=3)
-                        url = wikipedia.page(page_name).url
-                        results.append(
-                            {"title": f"Wiki: {page_name}", "body": summary, "href": url}
-                        )
-                    except Exception:
-                        continue
-            except Exception as e:
-                logger.warning(f"Wikipedia search failed: {e}")
+            results.extend(wiki_future.result())
 
         return results
 
+    def _fetch_wikipedia(self, query: str) -> list[dict[str, str]]:
+        try:
+            return WebSearch.wiki_summaries(query, pages=2, sentences=3)
+        except Exception as e:
+            logger.warning(f"Wikipedia search failed: {e}")
+            return []
+
     def _evaluate_relevance(self, title: str, snippet: str) -> tuple[int, str]:
-        system_prompt = (
-            "You are a technical filter for an AGI project."
-            "Evaluate relevance (0-10) of the content for a developer."
-            'Return raw JSON: {"score": int, "reason": "string"}.'
-        )
         user_prompt = f"Topic: {title}\nDetails: {snippet}"
 
-        raw_response = self._ask_model(user_prompt, system_prompt)
+        raw_response = self._ask_model(user_prompt, self.RELEVANCE_SYSTEM)
+        return self._parse_relevance(title, raw_response)
 
+    def _parse_relevance(self, title: str, raw_response: str) -> tuple[int, str]:
         # Robust JSON cleaning
         clean_json = raw_response.strip()
         if "```" in clean_json:
@@ -155,12 +166,23 @@ class ResearchExpert(BaseExpert):
 
         try:
             repo = self.gh_client.get_repo(self.repo_name)
-            for issue in repo.get_issues(state="open"):
-                if title[:30] in issue.title:
-                    return
+            open_titles = self._get_open_issue_titles(repo)
+            if any(title[:30] in t for t in open_titles):
+                return
 
             body = f"**Relevance:** {reason}\n\n**Context:**\n{snippet}\n\n**Source:** {link}"
-            repo.create_issue(title=f"[Research] {title}", body=body, labels=["enhancement"])
+            issue = repo.create_issue(
+                title=f"[Research] {title}", body=body, labels=["enhancement"]
+            )
+            open_titles.add(issue.title)
             print(f"   💎 [GitHub] Created Issue: {title}")
         except Exception as e:
             logger.error(f"GitHub Error: {e}")
+
+    def _get_open_issue_titles(self, repo) -> set[str]:
+        now = time.monotonic()
+        if self._open_issue_titles is None or now - self._issues_fetched_at > self.ISSUE_CACHE_TTL:
+            self._open_issue_titles = {issue.title for issue in repo.get_issues(state="open")}
+            self._issues_fetched_at = now
+
+        return self._open_issue_titles
@@ -2,16 +2,10 @@ import logging
 from typing import Any
 
 from fusionbrain.experts.base_expert import BaseExpert
+from fusionbrain.utils.web_search import DDG_AVAILABLE, WebSearch
 
 logger = logging.getLogger(__name__)
 
-try:
-    from duckduckgo_search import DDGS
-
-    DDG_AVAILABLE = True
-except ImportError:
-    DDG_AVAILABLE = False
-
 
 class WebExpert(BaseExpert):
     """
@@ -61,26 +55,22 @@ class WebExpert(BaseExpert):
         """
         Запрос к DuckDuckGo. Возвращает отформатированный текст с содержанием сайтов.
         """
-        results_text = ""
+        parts: list[str] = []
         try:
-            with DDGS() as ddgs:
-                results = ddgs.text(query, max_results=max_results, backend="api")
+            results = WebSearch.ddg_text(query, max_results=max_results, backend="api")
 
-                if not results:
-                    return ""
+            if not results:
+                return ""
 
-                for i, r in enumerate(results):
-                    title = r.get("title", "Без заголовка")
-                    body = r.get("body", "Нет описания")
-                    href = r.get("href", "#")
+            for i, r in enumerate(results):
+                title = r.get("title", "Без заголовка")
+                body = r.get("body", "Нет описания")
+                href = r.get("href", "#")
 
-                    results_text += f"SOURCE #{i + 1}\n"
-                    results_text += f"Title: {title}\n"
-                    results_text += f"Content: {body}\n"
-                    results_text += f"URL: {href}\n\n"
+                parts.append(f"SOURCE #{i + 1}\nTitle: {title}\nContent: {body}\nURL: {href}\n\n")
 
         except Exception as e:
             logger.error(f"DuckDuckGo error: {e}")
             return f"Error during search: {str(e)}"
 
-        return results_text
+        return "".join(parts)
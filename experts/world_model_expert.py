@@ -1,10 +1,16 @@
 import json
 import logging
+import re
 
 from .base_expert import BaseExpert
 
 logger = logging.getLogger(__name__)
 
+# Ключевые слова намерений и риска: по одному проходу по промпту на каждую группу
+_CODE_RE = re.compile(r"код|python", re.IGNORECASE)
+_RESEARCH_RE = re.compile(r"research|найди", re.IGNORECASE)
+_DANGER_RE = re.compile(r"удалить|hack", re.IGNORECASE)
+
 
 class WorldModelExpert(BaseExpert):
     def __init__(self):
@@ -36,17 +42,14 @@ class WorldModelExpert(BaseExpert):
 
     def _update_state(self, prompt: str):
         """Парсит промпт и обновляет переменные состояния."""
-        if "код" in prompt or "python" in prompt:
+        if _CODE_RE.search(prompt):
             self.state["user_intent"] = "coding"
-        elif "research" in prompt or "найди" in prompt:
+        elif _RESEARCH_RE.search(prompt):
             self.state["user_intent"] = "research"
         else:
             self.state["user_intent"] = "general_chat"
 
-        if "удалить" in prompt or "hack" in prompt:
-            self.state["risk_level"] = "HIGH"
-        else:
-            self.state["risk_level"] = "LOW"
+        self.state["risk_level"] = "HIGH" if _DANGER_RE.search(prompt) else "LOW"
 
     def _simulate_outcome(self, action: str) -> str:
         """
@@ -1,9 +1,37 @@
 import logging
+import re
 import time
+from collections import deque
 from typing import Any
 
 logger = logging.getLogger(__name__)
 
+# Маркеры в итоговом ответе, влияющие на награду: один проход вместо восьми проверок `in`
+_REWARD_RE = re.compile(
+    r"(?P<sandbox>Sandbox Output)"
+    r"|(?P<error>Error|Traceback)"
+    r"|(?P<verifier>Verifier Report)"
+    r"|(?P<ok>No critical errors|Looks good)"
+    r"|(?P<bad>Hallucination|Logic error)"
+)
+
+# Триггеры уроков одной регуляркой: группа = правило, проход по ответу один
+_LESSON_RE = re.compile(
+    r"(?P<syntax>Sandbox Error|SyntaxError)"
+    r"|(?P<search>No information found|Nothing relevant)"
+    r"|(?P<hallucination>Hallucination)"
+    r"|(?P<security>Forbidden|Security Alert)"
+)
+
+# Правила в порядке приоритета; шаблон получает первые 40 символов промпта
+_LESSONS = (
+    ("syntax", "Always validate Python syntax and imports. Context: {}"),
+    ("search", "Use broader search queries. Context: {}"),
+    ("hallucination", "Do not invent APIs. Verify libraries. Context: {}"),
+    ("security", "Never use dangerous system commands."),
+)
+_DEFAULT_LESSON = "Double-check reasoning logic before final answer."
+
 
 class MetaLearning:
     """
@@ -11,19 +39,25 @@ class MetaLearning:
     Tracks trajectories, calculates rewards, and learns from mistakes.
     """
 
+    # Ограничения истории: память не растет с числом эпизодов и шагов
+    MAX_TRAJECTORY = 4096
+    REWARD_HISTORY = 8192
+
     def __init__(self, memory_ref: Any):
         self.memory = memory_ref
-        self.reward_buffer: list[float] = []
-        self.trajectory: list[dict[str, Any]] = []
+        self.reward_buffer: deque[float] = deque(maxlen=self.REWARD_HISTORY)
+        self.trajectory: deque[dict[str, Any]] = deque(maxlen=self.MAX_TRAJECTORY)
         self.stats: dict[str, float] = {"lessons_learned": 0.0, "total_reward": 0.0}
 
     # -----------------------------------------------------
 
     def track(self, expert_name: str, output: str) -> None:
+        # Ответы экспертов почти всегда уже строки: str() нужен только для остального
+        text = output if isinstance(output, str) else str(output)
         self.trajectory.append(
             {
                 "expert": expert_name,
-                "output": str(output)[:1000],
+                "output": text[:1000],
                 "ts": time.time(),
             }
         )
@@ -36,16 +70,15 @@ class MetaLearning:
         if final_response and len(final_response) > 20:
             reward += 0.2
 
-        if "Sandbox Output" in final_response:
-            if "Error" not in final_response and "Traceback" not in final_response:
-                reward += 0.8
-            else:
-                reward -= 0.5
+        found = {m.lastgroup for m in _REWARD_RE.finditer(final_response)}
+
+        if "sandbox" in found:
+            reward += -0.5 if "error" in found else 0.8
 
-        if "Verifier Report" in final_response:
-            if "No critical errors" in final_response or "Looks good" in final_response:
+        if "verifier" in found:
+            if "ok" in found:
                 reward += 0.3
-            elif "Hallucination" in final_response or "Logic error" in final_response:
+            elif "bad" in found:
                 reward -= 0.5
 
         self.reward_buffer.append(reward)
@@ -72,19 +105,13 @@ class MetaLearning:
     # -----------------------------------------------------
 
     def _formulate_lesson(self, prompt: str, response: str) -> str:
-        if "Sandbox Error" in response or "SyntaxError" in response:
-            return f"Always validate Python syntax and imports. Context: {prompt[:40]}"
-
-        if "No information found" in response or "Nothing relevant" in response:
-            return f"Use broader search queries. Context: {prompt[:40]}"
-
-        if "Hallucination" in response:
-            return f"Do not invent APIs. Verify libraries. Context: {prompt[:40]}"
-
-        if "Forbidden" in response or "Security Alert" in response:
-            return "Never use dangerous system commands."
+        # Один проход по ответу; при нескольких совпадениях правило выбирается по приоритету
+        found = {m.lastgroup for m in _LESSON_RE.finditer(response)}
+        for rule, template in _LESSONS:
+            if rule in found:
+                return template.format(prompt[:40])
 
-        return "Double-check reasoning logic before final answer."
+        return _DEFAULT_LESSON
 
     # -----------------------------------------------------
 
@@ -1,18 +1,24 @@
+import logging
 import os
 import sys
 
-current_dir = os.path.dirname(os.path.abspath(__file__))
-
-
-parent_dir = os.path.dirname(current_dir)
+# Запуск файлом (python run.py) из исходников: пакет fusionbrain лежит на уровень выше.
+# При установленном пакете (консольная команда fusionbrain, python -m fusionbrain.run)
+# путь не трогается.
+if not __package__:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from fusionbrain import FusionBrain
 
-sys.path.insert(0, parent_dir)
-# -------------------
 
-from fusionbrain import FusionBrain
+def main():
+    # Логирование настраивает приложение, а не модули библиотеки
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
+        datefmt="%H:%M:%S",
+    )
 
-if __name__ == "__main__":
     print("Initializing FusionBrain System...")
 
     try:
@@ -23,3 +29,7 @@ if __name__ == "__main__":
         print("\n[System] Shutdown initiated.")
     except Exception as e:
         print(f"\n[System] Critical Startup Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
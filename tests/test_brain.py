@@ -0,0 +1,152 @@
+import json
+import unittest
+from unittest import mock
+
+from fusionbrain.core import brain as brain_module
+from fusionbrain.core.brain import FusionBrain
+from fusionbrain.experts import base_expert
+
+
+class _FakeResponse:
+    """Ответ Ollama /api/chat: целиком или построчным NDJSON при stream=True."""
+
+    def __init__(self, text: str, status_code: int = 200):
+        self.status_code = status_code
+        self.text = text
+        self._text = text
+
+    def json(self):
+        return {"message": {"content": self._text}}
+
+    def iter_lines(self):
+        for piece in (self._text[:3], self._text[3:]):
+            yield json.dumps({"message": {"content": piece}}).encode()
+        yield json.dumps({"done": True}).encode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class ThinkTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(brain_module, "KnowledgeBase"),
+            mock.patch.object(brain_module, "Sandbox"),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.brain = FusionBrain()
+        self.addCleanup(self.brain._pool.shutdown)
+
+        self.brain.knowledge.lookup_response.return_value = (None, None)
+        self.brain.knowledge.retrieve.return_value = "fact"
+        self.brain.router.classify_intent = mock.Mock(
+            return_value={"intent": "CHAT", "expert": "ReasoningExpert", "difficulty": 1}
+        )
+
+        self.requests: list[dict] = []
+        self.status_code = 200
+
+        def post(url, json=None, **kwargs):
+            self.requests.append(json)
+            return _FakeResponse("hello world, a long enough answer", self.status_code)
+
+        session = mock.patch.object(base_expert, "_SESSION")
+        session.start().post.side_effect = post
+        self.addCleanup(session.stop)
+
+    def test_stream_sends_same_request_as_blocking(self):
+        blocking = self.brain.think("привет")
+
+        tokens: list[str] = []
+        streamed = self.brain.think("привет", on_token=tokens.append)
+
+        self.assertEqual(len(self.requests), 2)
+        plain, stream = self.requests
+        self.assertFalse(plain.pop("stream"))
+        self.assertTrue(stream.pop("stream"))
+        self.assertEqual(plain, stream)
+
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual("".join(tokens), streamed)
+        self.assertEqual(streamed, blocking)
+
+    def test_user_prompt_not_truncated(self):
+        prompt = "начало " + "x" * 6000 + " конец"
+        self.brain.think(prompt)
+
+        self.assertEqual(self.requests[-1]["messages"][-1]["content"], prompt)
+
+    def _route(self, intent: str, expert: str = "ReasoningExpert"):
+        self.brain.router.classify_intent.return_value = {
+            "intent": intent,
+            "expert": expert,
+            "difficulty": 1,
+        }
+
+    def test_successful_chat_is_cached(self):
+        self.brain.think("привет")
+        self.brain.knowledge.store_response.assert_called_once()
+
+    def test_failed_turn_not_cached(self):
+        self.status_code = 500
+        self.brain.think("привет")
+        self.brain.knowledge.store_response.assert_not_called()
+
+    def test_research_not_cached(self):
+        self._route("RESEARCH", "ResearchExpert")
+        with mock.patch.object(
+            self.brain.research_expert, "run", return_value="fresh news from the web today"
+        ):
+            self.brain.think("что нового")
+
+        self.brain.knowledge.store_response.assert_not_called()
+
+    def test_cache_hit_skips_pipeline(self):
+        self.brain.knowledge.lookup_response.return_value = ("cached answer", None)
+
+        self.assertEqual(self.brain.think("привет"), "cached answer")
+        self.assertEqual(self.requests, [])
+        self.brain.router.classify_intent.assert_not_called()
+
+    def test_stream_credits_routed_expert(self):
+        with mock.patch.object(self.brain.meta_learner, "track") as track:
+            self.brain.think("привет", on_token=lambda _t: None)
+
+        self.assertEqual(track.call_args.args[0], "ReasoningExpert")
+
+
+class KnowledgeContextTest(unittest.TestCase):
+    def test_repeated_hits_collapsed(self):
+        lesson = "[LESSON] Always validate Python syntax and imports. Context: sort a list"
+        retrieved = f"{lesson}\n[GENERAL] Python lists have sort()\n{lesson}"
+
+        knowledge = FusionBrain._knowledge_context(retrieved)
+
+        self.assertEqual(knowledge.count(lesson), 1)
+        self.assertIn("[SEEN §1]", knowledge)
+        self.assertIn("[GENERAL] Python lists have sort()", knowledge)
+
+    def test_budget_keeps_nearest_hit(self):
+        near = "[LESSON] " + "near " * 300
+        far = "[GENERAL] " + "far " * 300
+
+        with mock.patch.object(FusionBrain, "CONTEXT_TOKEN_BUDGET", 500):
+            knowledge = FusionBrain._knowledge_context(f"{near}\n{far}", user_prompt="q" * 400)
+
+        kept_near, kept_far = knowledge.split("\n")
+        self.assertEqual(kept_near, near)
+        self.assertLess(len(kept_far), 250)
+        self.assertTrue(kept_far.startswith("[GENERAL] far"))
+
+    def test_empty(self):
+        self.assertEqual(FusionBrain._knowledge_context(""), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
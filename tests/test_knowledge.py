@@ -0,0 +1,137 @@
+import hashlib
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+from fusionbrain.core.knowledge import KnowledgeBase
+
+
+def _fake_encode(texts):
+    # Детерминированный единичный вектор на текст (без учета регистра): одинаковые тексты
+    # совпадают, разные далеки друг от друга
+    rows = []
+    for text in texts:
+        digest = hashlib.blake2b(text.lower().encode(), digest_size=8).digest()
+        seed = int.from_bytes(digest, "little")
+        vec = np.random.default_rng(seed).standard_normal(32)
+        rows.append(vec / np.linalg.norm(vec))
+    return np.array(rows, dtype=np.float32)
+
+
+class FakeCollection:
+    """Минимальная коллекция Chroma в памяти с косинусной дистанцией."""
+
+    def __init__(self):
+        self.docs: dict[str, tuple[str, np.ndarray, dict]] = {}
+
+    def count(self):
+        return len(self.docs)
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        for doc_id, doc, emb, meta in zip(ids, documents, embeddings, metadatas, strict=True):
+            self.docs[doc_id] = (doc, np.asarray(emb, dtype=np.float32), meta)
+
+    def get(self, ids=None, include=None):
+        keys = [i for i in ids if i in self.docs] if ids is not None else list(self.docs)
+        return {"ids": keys, "metadatas": [self.docs[i][2] for i in keys]}
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.docs.pop(doc_id, None)
+
+    def query(self, query_embeddings, n_results, where=None):
+        q = np.asarray(query_embeddings[0], dtype=np.float32)
+        hits = sorted(
+            (
+                (1.0 - float(emb @ q), doc_id)
+                for doc_id, (_, emb, meta) in self.docs.items()
+                if not where or all(meta.get(k) == v for k, v in where.items())
+            )
+        )[:n_results]
+        return {
+            "ids": [[doc_id for _, doc_id in hits]],
+            "documents": [[self.docs[doc_id][0] for _, doc_id in hits]],
+            "metadatas": [[self.docs[doc_id][2] for _, doc_id in hits]],
+            "distances": [[dist for dist, _ in hits]],
+        }
+
+
+def make_knowledge() -> KnowledgeBase:
+    kb = KnowledgeBase()
+    kb.wait_ready()
+    kb.encoder = object()
+    kb.encode_many = _fake_encode
+    kb.collection = FakeCollection()
+    kb.resp_cache = FakeCollection()
+    return kb
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.kb = make_knowledge()
+
+    def test_hit(self):
+        cached, embedding = self.kb.lookup_response("what is a monad")
+        self.assertIsNone(cached)
+
+        self.kb.store_response("what is a monad", "a monoid in endofunctors", embedding)
+
+        cached, _ = self.kb.lookup_response("What is a monad")
+        self.assertEqual(cached, "a monoid in endofunctors")
+
+    def test_miss(self):
+        self.kb.store_response("what is a monad", "a monoid in endofunctors")
+
+        cached, embedding = self.kb.lookup_response("weather in Paris today")
+        self.assertIsNone(cached)
+        self.assertIsNotNone(embedding)
+
+    def test_expired_entry_dropped(self):
+        self.kb.store_response("what is a monad", "a monoid in endofunctors")
+
+        later = time.time() + self.kb.RESP_CACHE_TTL + 1
+        with mock.patch("fusionbrain.core.knowledge.time.time", return_value=later):
+            cached, _ = self.kb.lookup_response("what is a monad")
+
+        self.assertIsNone(cached)
+        self.assertEqual(self.kb.resp_cache.count(), 0)
+
+
+class WriteQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.kb = make_knowledge()
+        self.kb._writer = threading.Thread(target=self.kb._writer_loop, daemon=True)
+        self.kb._writer.start()
+
+    def test_flush_waits_for_queued_writes(self):
+        self.kb.add_many([f"fact {i}" for i in range(10)], category="general")
+        self.kb.flush()
+
+        self.assertEqual(self.kb.collection.count(), 10)
+        self.assertEqual(self.kb._write_queue.unfinished_tasks, 0)
+
+    def test_lesson_visible_to_next_retrieve(self):
+        lesson = "[LESSON] Always validate Python syntax"
+        self.assertEqual(self.kb.retrieve(lesson), "")
+
+        # Пустой результат уже лежит в LRU; урок ставится в очередь и сразу ищется
+        self.kb.add_if_novel(lesson, category="meta")
+
+        self.assertEqual(self.kb.retrieve(lesson), f"[META] {lesson}")
+
+    def test_overflow_written_synchronously(self):
+        # Без writer очередь на один документ: второй не помещается и пишется сразу
+        with mock.patch.object(KnowledgeBase, "WRITE_QUEUE_SIZE", 1):
+            kb = make_knowledge()
+
+        kb.add("queued fact")
+        kb.add("sync fact")
+
+        self.assertEqual(kb.collection.count(), 1)
+        self.assertEqual(kb._write_queue.qsize(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from fusionbrain.core.memory import HNSW_AVAILABLE, Memory, _dumps
+
+
+class MemoryWrapAroundTest(unittest.TestCase):
+    """Вытеснение из заполненного буфера не должно ломать индексы и поиск."""
+
+    def _filled(self, max_items=4, total=10):
+        memory = Memory(max_items=max_items)
+        for i in range(total):
+            memory.store("user", f"note {i}", topic="t")
+        return memory
+
+    def test_by_topic_after_wrap(self):
+        memory = self._filled()
+
+        contents = sorted(m["content"] for m in memory.by_topic("t"))
+        self.assertEqual(contents, ["note 6", "note 7", "note 8", "note 9"])
+
+    def test_similarity_after_wrap(self):
+        memory = Memory(max_items=4)
+        for i in range(4):
+            memory.store("user", f"note {i}")
+
+        rng = np.random.default_rng(0)
+        memory.embed_hook(lambda _text: rng.standard_normal(8).tolist())
+
+        # Буфер переполняется уже после построения матрицы эмбеддингов
+        for i in range(4, 7):
+            memory.store("user", f"note {i}")
+
+        live = {m["id"] for m in memory.buffer}
+        found = memory.similarity(rng.standard_normal(8), top_k=5)
+
+        self.assertEqual(len(found), 1)
+        self.assertTrue(all(m["id"] in live for m in found))
+
+    @unittest.skipUnless(HNSW_AVAILABLE, "hnswlib не установлен")
+    def test_hnsw_similarity_after_wrap(self):
+        memory = Memory(max_items=8)
+        memory.ANN_THRESHOLD = 4
+        for i in range(8):
+            memory.store("user", f"note {i}")
+
+        rng = np.random.default_rng(0)
+        memory.embed_hook(lambda _text: rng.standard_normal(8).tolist())
+        self.assertIsNotNone(memory._hnsw)
+
+        for i in range(8, 12):
+            memory.store("user", f"note {i}")
+
+        live = {m["id"] for m in memory.buffer}
+        found = memory.similarity(rng.standard_normal(8), top_k=8)
+
+        self.assertEqual(len(found), 4)
+        self.assertTrue(all(m["id"] in live for m in found))
+
+
+class MemorySearchTest(unittest.TestCase):
+    def setUp(self):
+        self.memory = Memory()
+        for text in ("I love Python", "Исправь ошибку кода", "Hello world"):
+            self.memory.store("user", text)
+
+    def _search(self, keyword):
+        return [m["content"] for m in self.memory.search(keyword)]
+
+    def test_substring_of_token(self):
+        self.assertEqual(self._search("pyth"), ["I love Python"])
+
+    def test_cyrillic_inflection(self):
+        self.assertEqual(self._search("код"), ["Исправь ошибку кода"])
+        self.assertEqual(self._search("ОШИБК"), ["Исправь ошибку кода"])
+
+    def test_phrase_and_miss(self):
+        self.assertEqual(self._search("o wor"), ["Hello world"])
+        self.assertEqual(self._search("rust"), [])
+
+    def test_evicted_not_found(self):
+        memory = Memory(max_items=2)
+        for text in ("python one", "python two", "python three"):
+            memory.store("user", text)
+
+        self.assertEqual(
+            [m["content"] for m in memory.search("python")], ["python two", "python three"]
+        )
+
+
+class MemoryJournalTest(unittest.TestCase):
+    """Снапшот + журнал переживают сбой посреди дозаписи."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "memory.json")
+
+    def _crash(self, memory):
+        # Процесс умер: файл журнала закрывается без корректного завершения
+        memory._journal.close()
+        memory._journal = None
+
+    def test_load_skips_torn_tail(self):
+        memory = Memory()
+        memory.store("user", "before snapshot")
+        memory.save(self.path)
+        memory.store("user", "after snapshot")
+
+        line = _dumps(dict(memory.buffer[-1], id="torn", content="half")) + b"\n"
+        memory._journal.write(line[: len(line) // 2])
+        self._crash(memory)
+
+        restored = Memory()
+        restored.load(self.path)
+        contents = [m["content"] for m in restored.buffer]
+        self.assertEqual(contents, ["before snapshot", "after snapshot"])
+
+        # Оборванный хвост срезан: новая запись не склеивается с ним
+        restored.store("user", "after restart")
+        self._crash(restored)
+
+        again = Memory()
+        again.load(self.path)
+        contents = [m["content"] for m in again.buffer]
+        self.assertEqual(contents, ["before snapshot", "after snapshot", "after restart"])
+
+    def test_load_dedupes_snapshot_and_journal(self):
+        memory = Memory()
+        memory.store("user", "note")
+        memory.save(self.path)
+
+        # Та же запись успела попасть и в журнал, уже обновленной
+        memory._journal.write(_dumps(dict(memory.buffer[0], importance=3.0)) + b"\n")
+        self._crash(memory)
+
+        restored = Memory()
+        restored.load(self.path)
+
+        self.assertEqual(len(restored.buffer), 1)
+        self.assertEqual(restored.buffer[0]["importance"], 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
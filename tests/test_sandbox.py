@@ -0,0 +1,108 @@
+import os
+import subprocess
+import tempfile
+import textwrap
+import time
+import unittest
+from unittest import mock
+
+from fusionbrain.utils.sandbox import Sandbox
+
+
+def _alive(pid: int) -> bool:
+    # Зомби уже не исполняется: считается завершенным
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+class SandboxRunTest(unittest.TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        Sandbox._stop_worker()
+
+    def test_stdout_and_stderr(self):
+        output, rc = Sandbox.run("import sys\nprint('out')\nprint('err', file=sys.stderr)", 5)
+
+        self.assertEqual(rc, 0)
+        self.assertIn("out", output)
+        self.assertIn("err", output)
+
+    def test_returncode(self):
+        _, rc = Sandbox.run("raise SystemExit(3)", 5)
+        self.assertEqual(rc, 3)
+
+        output, rc = Sandbox.run("1 / 0", 5)
+        self.assertEqual(rc, 1)
+        self.assertIn("ZeroDivisionError", output)
+
+    def test_timeout(self):
+        with self.assertRaises(subprocess.TimeoutExpired):
+            Sandbox.run("while True: pass", 0.5)
+
+        # Воркер пережил таймаут и принимает следующий запуск
+        self.assertEqual(Sandbox.run("print('next')", 5), ("next\n", 0))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "нужен воркер на fork()")
+    def test_timeout_after_closed_output(self):
+        # Ребенок закрывает вывод и продолжает работать: воркер не должен ждать его вечно
+        start = time.monotonic()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            Sandbox.run("import os, time\nos.close(1)\nos.close(2)\ntime.sleep(60)", 0.5)
+
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(Sandbox.run("print('next')", 5), ("next\n", 0))
+
+    @unittest.skipUnless(os.path.exists("/proc"), "нужен /proc")
+    def test_background_process_killed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pid_file = os.path.join(tmp, "pid")
+            code = textwrap.dedent(
+                f"""
+                import os, time
+                if os.fork() == 0:
+                    os.close(1)
+                    os.close(2)
+                    with open({pid_file!r}, "w") as f:
+                        f.write(str(os.getpid()))
+                    time.sleep(60)
+                    os._exit(0)
+                print("parent done")
+                """
+            )
+            output, rc = Sandbox.run(code, 2)
+
+            self.assertEqual((output, rc), ("parent done\n", 0))
+
+            deadline = time.monotonic() + 2
+            while not os.path.exists(pid_file) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            with open(pid_file) as f:
+                pid = int(f.read())
+
+        deadline = time.monotonic() + 2
+        while _alive(pid) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(_alive(pid))
+
+    def test_fallback_to_one_shot(self):
+        with mock.patch.object(Sandbox, "_send", side_effect=BrokenPipeError("gone")):
+            output, rc = Sandbox.run("print('once')", 5)
+
+        self.assertEqual((output, rc), ("once\n", 0))
+
+    def test_no_rerun_after_worker_received_code(self):
+        with (
+            mock.patch.object(Sandbox, "_receive", side_effect=RuntimeError("worker exited")),
+            mock.patch.object(Sandbox, "_run_once") as run_once,
+            self.assertRaises(RuntimeError),
+        ):
+            Sandbox.run("print('x')", 5)
+
+        run_once.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
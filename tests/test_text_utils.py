@@ -0,0 +1,76 @@
+import unittest
+
+from fusionbrain.utils.text_utils import TextUtils
+
+
+class DedupBlocksTest(unittest.TestCase):
+    @staticmethod
+    def _boundary_line() -> str:
+        # Строка, после которой chunking гарантированно ставит границу
+        return next(
+            line
+            for line in (f"# separator {i}" for i in range(1000))
+            if TextUtils._chunk_lines(f"{line}\nx") == [line, "x"]
+        )
+
+    def test_repeated_chunk_becomes_reference(self):
+        sep = self._boundary_line()
+        shared = f"def answer():\n    return 42  # общий фрагмент\n{sep}"
+        first, second = TextUtils.dedup_blocks([f"{sep}\n{shared}", f"{shared}\noutro"])
+
+        self.assertEqual(first, f"{sep}\n[§1]\n{shared}")
+        self.assertEqual(second, "[SEEN §1]\noutro")
+
+    def test_identical_blocks(self):
+        report = "Step 1: parse input\nStep 2: validate schema\nStep 3: emit result"
+        first, second, third = TextUtils.dedup_blocks([report, report, report])
+
+        # Первое вхождение остается целиком, повторы — только ссылками
+        self.assertNotIn("SEEN", first)
+        self.assertTrue(first.startswith("[§1]\nStep 1"))
+        self.assertEqual(second, third)
+        self.assertNotIn("Step", second)
+        self.assertTrue(second.startswith("[SEEN §1]"))
+
+    def test_unique_blocks_untouched(self):
+        blocks = ["first report\nwith lines", "second report", ""]
+        self.assertEqual(TextUtils.dedup_blocks(blocks), blocks)
+
+    def test_short_repeats_kept(self):
+        # Ссылка была бы не короче самого фрагмента
+        self.assertEqual(TextUtils.dedup_blocks(["ok", "ok"]), ["ok", "ok"])
+
+    def test_chunking_is_content_defined(self):
+        text = "\n".join(f"line {i}" for i in range(50))
+        chunks = TextUtils._chunk_lines(text)
+
+        self.assertEqual("\n".join(chunks), text)
+        # Тот же текст после префикса режется на те же фрагменты
+        shifted = TextUtils._chunk_lines("prefix\n" + text)
+        self.assertEqual(chunks[1:], shifted[-len(chunks) + 1 :])
+
+
+class FitTokenBudgetTest(unittest.TestCase):
+    def test_trims_from_the_front(self):
+        blocks = ["old " * 100, "mid " * 100, "new " * 100]
+
+        fitted = TextUtils.fit_token_budget(blocks, budget=200, summary_chars=20)
+
+        # Бюджет расходуется с конца: последние блоки целиком, первый — резюме
+        self.assertEqual(fitted[1:], blocks[1:])
+        self.assertEqual(fitted[0], TextUtils.summarize(blocks[0], 20))
+        self.assertLessEqual(len(fitted[0]), 21)
+
+    def test_order_follows_caller(self):
+        blocks = ["a " * 200, "b " * 10]
+
+        self.assertEqual(TextUtils.fit_token_budget(blocks, budget=50)[1], blocks[1])
+        self.assertEqual(TextUtils.fit_token_budget(blocks[::-1], budget=50)[0], blocks[1])
+
+    def test_within_budget_untouched(self):
+        blocks = ["short", "blocks"]
+        self.assertEqual(TextUtils.fit_token_budget(blocks, budget=100), blocks)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,9 @@
 from .hash_utils import HashUtils
 from .io_utils import IOUtils
+from .text_utils import TextUtils
 
 __all__ = [
     "IOUtils",
     "HashUtils",
+    "TextUtils",
 ]
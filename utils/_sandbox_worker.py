@@ -0,0 +1,163 @@
+"""
+Долгоживущий процесс песочницы (запускается из utils.sandbox, не импортируется).
+
+Протокол по stdin/stdout (байты):
+    запрос:  b"<len> <timeout>\\n" + исходный код
+    ответ:   b"<returncode> <timed_out> <len>\\n" + объединенный вывод stdout/stderr
+
+Каждый фрагмент кода исполняется в отдельном fork() уже прогретого интерпретатора:
+старт занимает миллисекунды, а состояние между запусками не протекает.
+"""
+
+import contextlib
+import os
+import select
+import signal
+import sys
+import time
+import traceback
+import types
+
+MAX_OUTPUT = 1 << 20
+
+# Модули, которые почти всегда нужны сгенерированному коду и тестам критика.
+# Импортируются один раз в воркере, и каждый fork() получает их уже загруженными.
+PREWARM = (
+    "unittest",
+    "json",
+    "math",
+    "re",
+    "random",
+    "collections",
+    "itertools",
+    "functools",
+    "dataclasses",
+    "datetime",
+    "typing",
+)
+
+
+def _prewarm() -> None:
+    for name in PREWARM:
+        __import__(name)
+
+
+def _child(code: str, out_fd: int) -> None:
+    # Своя группа процессов: по таймауту убивается вместе со всем, что успела породить
+    os.setpgid(0, 0)
+
+    # Весь вывод, включая вывод C-расширений и дочерних процессов, идет в один канал
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(out_fd, 1)
+    os.dup2(out_fd, 2)
+    # Лишние копии канала закрываются: иначе EOF не наступит, пока жив любой потомок
+    os.close(out_fd)
+    os.close(devnull)
+
+    # Код исполняется как __main__: unittest.main() и прочие ищут тесты именно там
+    main = types.ModuleType("__main__")
+    sys.modules["__main__"] = main
+
+    rc = 0
+    try:
+        exec(compile(code, "<sandbox>", "exec"), main.__dict__)
+    except SystemExit as e:
+        rc = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException as e:
+        # Кадр самого воркера из трейсбека убирается
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        rc = 1
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(rc)
+
+
+def _kill_group(pid: int) -> None:
+    with contextlib.suppress(ProcessLookupError, PermissionError):
+        os.killpg(pid, signal.SIGKILL)
+
+
+def _collect(pid: int, read_fd: int, timeout: float) -> tuple[bytes, int, bool]:
+    deadline = time.monotonic() + timeout
+    chunks: list[bytes] = []
+    size = 0
+    timed_out = False
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            _kill_group(pid)
+            break
+
+        ready, _, _ = select.select([read_fd], [], [], remaining)
+        if not ready:
+            continue
+
+        data = os.read(read_fd, 65536)
+        if not data:
+            break
+
+        # Сверх лимита вывод дочитывается и выбрасывается, чтобы ребенок не встал на записи
+        if size < MAX_OUTPUT:
+            chunks.append(data[: MAX_OUTPUT - size])
+        size += len(data)
+
+    os.close(read_fd)
+
+    # EOF не значит, что ребенок завершился: он мог закрыть 1 и 2 и работать дальше.
+    # Ожидание идет в пределах того же срока, затем группа убивается.
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            break
+        if time.monotonic() >= deadline:
+            timed_out = True
+            _kill_group(pid)
+            _, status = os.waitpid(pid, 0)
+            break
+        time.sleep(0.005)
+
+    # Фоновые процессы, оставленные фрагментом в его группе, не переживают запуск
+    _kill_group(pid)
+    rc = os.waitstatus_to_exitcode(status)
+
+    return b"".join(chunks), rc, timed_out
+
+
+def main() -> None:
+    _prewarm()
+
+    inp = sys.stdin.buffer
+    out = sys.stdout.buffer
+
+    while True:
+        header = inp.readline()
+        if not header:
+            break
+
+        length, timeout = header.split()
+        code = inp.read(int(length)).decode("utf-8", errors="replace")
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+
+        if pid == 0:
+            os.close(read_fd)
+            _child(code, write_fd)
+
+        # Группа задается и со стороны родителя: killpg не должен опередить setpgid ребенка
+        with contextlib.suppress(OSError):
+            os.setpgid(pid, pid)
+
+        os.close(write_fd)
+        output, rc, timed_out = _collect(pid, read_fd, float(timeout))
+
+        out.write(b"%d %d %d\n" % (rc, timed_out, len(output)) + output)
+        out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,16 @@
 import hashlib
+import mmap
+import secrets
 import uuid
+from functools import lru_cache
+
+# Промпты длиннее этого хэшируются напрямую: кэш не должен держать мегабайтные ключи
+HASH_CACHE_MAX_LEN = 64 * 1024
+
+
+@lru_cache(maxsize=4096)
+def _sha256_cached(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
 class HashUtils:
@@ -18,7 +29,8 @@ class HashUtils:
         Генерирует короткий уникальный ID (удобно для логов).
         Пример: 'a1b2c3d4'
         """
-        return uuid.uuid4().hex[:length]
+        # Ровно столько случайных байт, сколько нужно, без сборки объекта UUID
+        return secrets.token_hex((length + 1) // 2)[:length]
 
     @staticmethod
     def compute_hash(text: str) -> str:
@@ -28,7 +40,10 @@ class HashUtils:
         """
         if not text:
             return ""
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if len(text) > HASH_CACHE_MAX_LEN:
+            return hashlib.sha256(text.encode("utf-8")).hexdigest()
+        # Одни и те же промпты приходят повторно: хэш берется из LRU
+        return _sha256_cached(text)
 
     @staticmethod
     def checksum(file_path: str) -> str | None:
@@ -36,11 +51,19 @@ class HashUtils:
         sha256 = hashlib.sha256()
         try:
             with open(file_path, "rb") as f:
-                while True:
-                    data = f.read(65536)
-                    if not data:
-                        break
-                    sha256.update(data)
+                # Файл отображается в память и хэшируется целиком, без копий по кускам
+                try:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        sha256.update(mm)
+                    return sha256.hexdigest()
+                except (OSError, ValueError):
+                    pass
+
+                # Запасной путь (пустые файлы, пайпы, сетевые ФС): чтение в один переиспользуемый буфер
+                buf = bytearray(1 << 20)
+                view = memoryview(buf)
+                while n := f.readinto(buf):
+                    sha256.update(view[:n])
             return sha256.hexdigest()
         except FileNotFoundError:
             return None
@@ -1,11 +1,30 @@
+import atexit
 import json
 import logging
+import mmap
 import os
-from typing import Any
+import threading
+from typing import IO, Any
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("IOUtils")
 
+# Открытые на дозапись JSONL-файлы: путь -> [файл, записей с последнего flush].
+# Файл держится открытым между вызовами, данные копятся в его буфере
+# и сбрасываются каждые JSONL_FLUSH_EVERY записей, при чтении и при выходе.
+JSONL_FLUSH_EVERY = 64
+_JSONL_WRITERS: dict[str, list] = {}
+_JSONL_LOCK = threading.Lock()
+
+# Директории, существование которых уже проверено: повторный ensure_dir обходится без stat
+_KNOWN_DIRS: set[str] = set()
+
 
 class IOUtils:
     """
@@ -17,21 +36,40 @@ class IOUtils:
     def ensure_dir(file_path: str):
         """Создает директорию для файла, если её нет."""
         directory = os.path.dirname(file_path)
-        if directory and not os.path.exists(directory):
+        if not directory or directory in _KNOWN_DIRS:
+            return
+
+        if not os.path.exists(directory):
             try:
-                os.makedirs(directory)
-                logger.info(f"Created directory: {directory}")
+                os.makedirs(directory, exist_ok=True)
+                logger.debug("Created directory: %s", directory)
             except OSError as e:
                 logger.error(f"Error creating directory {directory}: {e}")
+                return
+
+        _KNOWN_DIRS.add(directory)
 
     @staticmethod
     def save_json(path: str, data: dict | list, indent: int = 2):
-        """Сохраняет данные в обычный JSON файл."""
+        """
+        Сохраняет данные в обычный JSON файл.
+        Запись атомарная: во временный файл рядом и os.replace, поэтому
+        прерванное сохранение не оставляет обрезанный JSON.
+        """
         IOUtils.ensure_dir(path)
+        tmp = path + ".tmp"
         try:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=indent, ensure_ascii=False)
-            logger.debug(f"Saved JSON to {path}")
+            # orjson умеет только отступ в 2 пробела; остальные варианты — через json
+            if ORJSON_AVAILABLE and indent in (None, 2):
+                option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+                payload = orjson.dumps(data, option=option)
+            else:
+                payload = json.dumps(data, indent=indent, ensure_ascii=False).encode("utf-8")
+
+            with open(tmp, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+            logger.debug("Saved JSON to %s", path)
         except Exception as e:
             logger.error(f"Failed to save JSON to {path}: {e}")
 
@@ -42,8 +80,19 @@ class IOUtils:
             return default if default is not None else {}
 
         try:
-            with open(path, encoding="utf-8") as f:
-                return json.load(f)
+            with open(path, "rb") as f:
+                if not ORJSON_AVAILABLE:
+                    return json.load(f)
+
+                # orjson разбирает отображенный в память файл без промежуточной копии в bytes
+                try:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    # Пустой файл не отображается: это тот же битый JSON
+                    raise json.JSONDecodeError("Empty file", "", 0) from None
+
+                with mm, memoryview(mm) as view:
+                    return orjson.loads(view)
         except json.JSONDecodeError:
             logger.error(f"Corrupted JSON file: {path}")
             return default if default is not None else {}
@@ -56,27 +105,74 @@ class IOUtils:
         """
         Добавляет одну запись в JSONL (JSON Lines) файл.
         Идеально для логов событий и истории чата.
+        Запись буферизуется; IOUtils.flush_jsonl() сбрасывает ее на диск досрочно.
         """
-        IOUtils.ensure_dir(path)
+        if ORJSON_AVAILABLE:
+            line = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        else:
+            line = json.dumps(data, ensure_ascii=False)
+
         try:
-            with open(path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(data, ensure_ascii=False) + "\n")
+            with _JSONL_LOCK:
+                writer = _JSONL_WRITERS.get(path)
+                if writer is None:
+                    IOUtils.ensure_dir(path)
+                    writer = [_open_jsonl(path), 0]
+                    _JSONL_WRITERS[path] = writer
+
+                writer[0].write(line + "\n")
+                writer[1] += 1
+                if writer[1] >= JSONL_FLUSH_EVERY:
+                    writer[0].flush()
+                    writer[1] = 0
         except Exception as e:
             logger.error(f"Failed to append to JSONL {path}: {e}")
 
+    @staticmethod
+    def flush_jsonl(path: str | None = None):
+        """Сбрасывает на диск буферы append_jsonl (одного файла или всех)."""
+        with _JSONL_LOCK:
+            if path is None:
+                writers = list(_JSONL_WRITERS.values())
+            else:
+                writers = [_JSONL_WRITERS[path]] if path in _JSONL_WRITERS else []
+
+            for writer in writers:
+                writer[0].flush()
+                writer[1] = 0
+
     @staticmethod
     def load_jsonl(path: str) -> list[dict]:
         """Читает весь JSONL файл в список словарей."""
+        IOUtils.flush_jsonl(path)
+
         if not os.path.exists(path):
             return []
 
+        # Файл читается одним куском, строки разбираются C-парсером (orjson, если есть)
+        loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+
         result = []
         try:
-            with open(path, encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        result.append(json.loads(line))
+            with open(path, "rb") as f:
+                data = f.read()
+
+            for line in data.split(b"\n"):
+                if line.strip():
+                    result.append(loads(line))
         except Exception as e:
             logger.error(f"Error reading JSONL {path}: {e}")
 
         return result
+
+
+def _open_jsonl(path: str) -> IO[str]:
+    return open(path, "a", encoding="utf-8", buffering=64 * 1024)  # noqa: SIM115 — закрывается в _close_jsonl
+
+
+@atexit.register
+def _close_jsonl():
+    with _JSONL_LOCK:
+        for writer in _JSONL_WRITERS.values():
+            writer[0].close()
+        _JSONL_WRITERS.clear()
@@ -0,0 +1,166 @@
+import contextlib
+import logging
+import os
+import select
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+logger = logging.getLogger("Sandbox")
+
+_WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_sandbox_worker.py")
+
+# Путь к интерпретатору резолвится один раз. close_fds=False безопасен (с PEP 446
+# дескрипторы по умолчанию не наследуются) и открывает быстрый путь posix_spawn
+_PY = shutil.which(sys.executable) or sys.executable
+
+# Один прогретый воркер на процесс; запросы к нему идут строго по очереди
+_WORKER: subprocess.Popen | None = None
+_LOCK = threading.Lock()
+
+
+class Sandbox:
+    """
+    Исполнение сгенерированного кода в отдельном процессе.
+    На POSIX код уходит в долгоживущий воркер (fork на каждый запуск вместо
+    fork+exec нового интерпретатора). Если воркер недоступен или упал —
+    разовый запуск интерпретатора с кодом на stdin.
+    """
+
+    # Запас сверх таймаута кода на ответ самого воркера
+    WORKER_GRACE = 5.0
+
+    @staticmethod
+    def run(code: str, timeout: float) -> tuple[str, int]:
+        """
+        Возвращает (stdout + stderr, returncode).
+        При превышении таймаута бросает subprocess.TimeoutExpired, как subprocess.run.
+        """
+        if hasattr(os, "fork"):
+            with _LOCK:
+                try:
+                    worker = Sandbox._send(code, timeout)
+                except Exception as e:
+                    # Запрос до воркера не дошел, код не исполнялся: можно запустить разово
+                    logger.warning("Sandbox worker unavailable, running once: %s", e)
+                    Sandbox._stop_worker()
+                    return Sandbox._run_once(code, timeout)
+
+                try:
+                    return Sandbox._receive(worker, timeout)
+                except subprocess.TimeoutExpired:
+                    raise
+                except Exception as e:
+                    # Код уже мог выполниться (например, сам испортил канал ответа):
+                    # второй раз он не запускается, ошибка уходит вызывающему
+                    logger.warning("Sandbox worker failed, restarting: %s", e)
+                    Sandbox._stop_worker()
+                    raise RuntimeError(f"sandbox worker failed: {e}") from e
+
+        return Sandbox._run_once(code, timeout)
+
+    @staticmethod
+    def prewarm() -> None:
+        """Поднимает воркер заранее (при старте сервиса), а не на первом запросе."""
+        if not hasattr(os, "fork"):
+            return
+
+        with _LOCK:
+            try:
+                Sandbox._ensure_worker()
+            except Exception as e:
+                logger.warning("Sandbox prewarm failed: %s", e)
+
+    @staticmethod
+    def _ensure_worker() -> subprocess.Popen:
+        global _WORKER
+
+        if _WORKER is None or _WORKER.poll() is not None:
+            _WORKER = subprocess.Popen(
+                [_PY, "-u", _WORKER_PATH],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                close_fds=False,
+            )
+
+        return _WORKER
+
+    @staticmethod
+    def _send(code: str, timeout: float) -> subprocess.Popen:
+        worker = Sandbox._ensure_worker()
+
+        data = code.encode("utf-8")
+        worker.stdin.write(b"%d %f\n" % (len(data), timeout) + data)
+        worker.stdin.flush()
+
+        return worker
+
+    @staticmethod
+    def _receive(worker: subprocess.Popen, timeout: float) -> tuple[str, int]:
+        header, output = Sandbox._read_reply(
+            worker.stdout.fileno(), time.monotonic() + timeout + Sandbox.WORKER_GRACE
+        )
+        rc, timed_out = int(header[0]), header[1] == b"1"
+
+        text = output.decode("utf-8", errors="replace")
+        if timed_out:
+            raise subprocess.TimeoutExpired(_WORKER_PATH, timeout, output=text)
+
+        return text, rc
+
+    @staticmethod
+    def _read_reply(fd: int, deadline: float) -> tuple[list[bytes], bytes]:
+        buf = bytearray()
+        header: list[bytes] | None = None
+
+        while header is None or len(buf) < int(header[2]):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError("worker did not answer in time")
+
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise RuntimeError("worker exited")
+            buf += chunk
+
+            if header is None and b"\n" in buf:
+                line, _, rest = bytes(buf).partition(b"\n")
+                header = line.split()
+                buf = bytearray(rest)
+
+        return header, bytes(buf)
+
+    @staticmethod
+    def _stop_worker() -> None:
+        global _WORKER
+
+        if _WORKER is not None:
+            if _WORKER.poll() is None:
+                _WORKER.kill()
+            _WORKER.wait()
+            # После сбоя отправки в буфере stdin может остаться недописанный запрос
+            with contextlib.suppress(OSError):
+                _WORKER.stdin.close()
+            _WORKER.stdout.close()
+            _WORKER = None
+
+    @staticmethod
+    def _run_once(code: str, timeout: float) -> tuple[str, int]:
+        # Код передается через stdin (`python -`): ни временного файла, ни его удаления
+        # stderr сливается в stdout еще в ядре: одна строка вывода вместо трех
+        result = subprocess.run(
+            [_PY, "-"],
+            input=code,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            timeout=timeout,
+            close_fds=False,
+        )
+        return result.stdout, result.returncode
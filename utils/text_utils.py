@@ -0,0 +1,84 @@
+import hashlib
+from collections import Counter
+
+
+class TextUtils:
+    """
+    Утилиты для подготовки текста перед отправкой в LLM.
+    """
+
+    # Граница чанка ставится после строки, чей хэш делится на CHUNK_MASK + 1 (в среднем раз в 8 строк)
+    CHUNK_MASK = 0b111
+
+    @staticmethod
+    def _chunk_lines(text: str) -> list[str]:
+        """
+        Content-defined chunking по строкам: границы зависят только от содержимого,
+        поэтому одинаковый фрагмент режется одинаково, где бы он ни встретился.
+        """
+        chunks: list[str] = []
+        current: list[str] = []
+
+        for line in text.splitlines():
+            current.append(line)
+            digest = hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest()
+            if digest[0] & TextUtils.CHUNK_MASK == 0:
+                chunks.append("\n".join(current))
+                current = []
+
+        if current:
+            chunks.append("\n".join(current))
+
+        return chunks
+
+    @staticmethod
+    def dedup_blocks(blocks: list[str]) -> list[str]:
+        """
+        Заменяет повторяющиеся фрагменты между блоками (например, ответами экспертов)
+        на ссылку [SEEN §N]. Первое вхождение повторяющегося фрагмента помечается [§N].
+        Короткие фрагменты, которые не длиннее самой ссылки, остаются как есть.
+        """
+        chunked = [TextUtils._chunk_lines(b) for b in blocks]
+        counts = Counter(c for chunks in chunked for c in chunks)
+
+        labels: dict[str, int] = {}
+        result: list[str] = []
+
+        for chunks in chunked:
+            out: list[str] = []
+            for chunk in chunks:
+                if counts[chunk] < 2 or len(chunk) <= 16:
+                    out.append(chunk)
+                elif chunk in labels:
+                    out.append(f"[SEEN §{labels[chunk]}]")
+                else:
+                    labels[chunk] = len(labels) + 1
+                    out.append(f"[§{labels[chunk]}]\n{chunk}")
+            result.append("\n".join(out))
+
+        return result
+
+    @staticmethod
+    def summarize(text: str, limit: int = 200) -> str:
+        """Дешевое «резюме» без LLM: начало текста, обрезанное по границе слова."""
+        if len(text) <= limit:
+            return text
+        return text[:limit].rsplit(" ", 1)[0] + "…"
+
+    @staticmethod
+    def fit_token_budget(blocks: list[str], budget: int, summary_chars: int = 200) -> list[str]:
+        """
+        Скользящее окно по бюджету токенов (~4 символа на токен). Блоки передаются
+        по возрастанию приоритета: бюджет расходуется с конца списка, эти блоки остаются
+        целиком, а начальные после исчерпания бюджета заменяются коротким резюме.
+        Порядок задает вызывающий код (свежесть, близость и т.п.), сама функция его не выводит.
+        """
+        result: list[str] = []
+        used = 0
+
+        for block in reversed(blocks):
+            used += len(block) // 4
+            result.append(block if used <= budget else TextUtils.summarize(block, summary_chars))
+
+        result.reverse()
+        return result
@@ -0,0 +1,77 @@
+import time
+import urllib.parse
+from functools import lru_cache
+
+try:
+    from duckduckgo_search import DDGS
+
+    DDG_AVAILABLE = True
+except ImportError:
+    DDG_AVAILABLE = False
+
+try:
+    import wikipedia
+
+    WIKIPEDIA_AVAILABLE = True
+except ImportError:
+    WIKIPEDIA_AVAILABLE = False
+
+WIKI_URL = "https://en.wikipedia.org/wiki/"
+
+# Время жизни закэшированной выдачи (сек): в пределах разговора разные эксперты
+# повторяют одни и те же запросы
+CACHE_TTL = 300
+CACHE_SIZE = 128
+
+
+class WebSearch:
+    """
+    Поиск DuckDuckGo и Википедии с общим LRU-кэшем на процесс.
+    Повторный запрос в пределах CACHE_TTL не уходит в сеть.
+    Ошибки не кэшируются: следующий вызов повторит запрос.
+    """
+
+    @staticmethod
+    def ddg_text(query: str, max_results: int = 5, backend: str = "api") -> list[dict[str, str]]:
+        """Текстовая выдача DuckDuckGo (title, body, href)."""
+        return list(_ddg_text(query, max_results, backend, _ttl_bucket()))
+
+    @staticmethod
+    def wiki_summaries(query: str, pages: int = 2, sentences: int = 3) -> list[dict[str, str]]:
+        """Краткие выжимки первых страниц Википедии по запросу (title, body, href)."""
+        return list(_wiki_summaries(query, pages, sentences, _ttl_bucket()))
+
+
+def _ttl_bucket() -> int:
+    # Номер окна времени входит в ключ кэша: со сменой окна старые записи больше не находятся
+    return int(time.monotonic() // CACHE_TTL)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _ddg_text(query: str, max_results: int, backend: str, bucket: int) -> tuple[dict, ...]:
+    if not DDG_AVAILABLE:
+        raise RuntimeError("duckduckgo_search is not installed")
+
+    with DDGS() as ddgs:
+        return tuple(ddgs.text(query, max_results=max_results, backend=backend) or ())
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _wiki_summaries(query: str, pages: int, sentences: int, bucket: int) -> tuple[dict, ...]:
+    if not WIKIPEDIA_AVAILABLE:
+        raise RuntimeError("wikipedia is not installed")
+
+    wikipedia.set_lang("en")
+
+    results = []
+    for page_name in wikipedia.search(query, results=pages):
+        try:
+            summary = wikipedia.summary(page_name, sentences=sentences)
+        except Exception:
+            continue
+
+        # URL однозначно следует из заголовка: без лишнего запроса page()
+        url = WIKI_URL + urllib.parse.quote(page_name.replace(" ", "_"))
+        results.append({"title": f"Wiki: {page_name}", "body": summary, "href": url})
+
+    return tuple(results)